@@ -6,6 +6,7 @@ import pandas as pd
 
 from panstat import util
 from panstat.util import shell
+from panstat.util.cache import ResultCache
 
 
 __epilog__ = click.style('''\n
@@ -16,6 +17,7 @@ examples:
     panstat batch -i input.txt -t 200000 --job run.job
     panstat batch -i input.txt -t 200000 --job run.job --point-type box
     panstat batch -i input.txt -t 200000 --job run.job --no-check
+    panstat batch -i input.txt -t 20000 --array slurm --pack 10 [then: bash shell/submit.sh]
 ''', fg='green')
 
 
@@ -33,6 +35,15 @@ examples:
 @click.option('--merge-dir', help='Path to the merge directory', type=click.Path(), default='merge', show_default=True)
 @click.option('-T', '--plot-type', help='The type of plot', type=click.Choice(['point', 'box']), default='point', show_default=True,
               show_choices=True)
+@click.option('--compress', help='Compress the stat result files', type=click.Choice(['gzip', 'xz', 'zstd']), show_choices=True)
+@click.option('--min-fraction', help='Also compute soft-core (quorum) statistics with this min fraction of genomes', type=click.FloatRange(0, 1, min_open=True))
+@click.option('--top', help='Report the N combinations with the smallest and largest counts per k', type=click.IntRange(min=1))
+@click.option('--cache-dir', help='Directory of the result cache, cached units are reused instead of recomputed',
+              type=click.Path(), envvar='PANSTAT_CACHE_DIR')
+@click.option('--cache-size', help='Max size of the result cache in GB, least recently used results are evicted', type=float)
+@click.option('--array', help='Generate one parameter table and one array job script per k level instead of one shell per unit',
+              type=click.Choice(['slurm', 'sge', 'generic']), show_choices=True)
+@click.option('--pack', help='Number of units computed by each array task', type=click.IntRange(min=1), default=1, show_default=True)
 @click.option('--job', help='Generate SJM Job')
 @click.option('--no-check', help='Do not check queues for SJM', is_flag=True)
 def main(**kwargs):
@@ -58,6 +69,37 @@ def main(**kwargs):
     shell_dir = output_dir / 'shell'
     result_dir = output_dir / 'result'
 
+    cache = ResultCache.from_options(kwargs['cache_dir'], kwargs['cache_size'])
+
+    if kwargs['array']:
+        if job:
+            raise click.UsageError('--job (SJM) does not support array jobs, use the generated submit.sh instead')
+
+        array_shells = list(shell.generate_array_shells(chunkcounts=chunkcounts,
+                                                        total_lines=total_lines,
+                                                        input_file=input_file,
+                                                        shell_dir=shell_dir,
+                                                        result_dir=result_dir,
+                                                        start_col=start_col,
+                                                        sep=sep,
+                                                        scheduler=kwargs['array'],
+                                                        pack=kwargs['pack'],
+                                                        compress=kwargs['compress'],
+                                                        min_fraction=kwargs['min_fraction'],
+                                                        cache=cache,
+                                                        top=kwargs['top']))
+        merge_shell = shell.generate_merge_shell(result_dir=result_dir,
+                                                 shell_dir=shell_dir,
+                                                 merge_dir=merge_dir)
+        plot_shell = shell.generate_plot_shell(output_dir=output_dir,
+                                               result_dir=merge_dir,
+                                               shell_dir=shell_dir,
+                                               plot_type=plot_type,
+                                               processed_file=Path(f'processed_stats.{plot_type}.tsv').resolve())
+        submit_shell = shell.generate_submit_shell(array_shells, merge_shell, plot_shell, shell_dir, kwargs['array'])
+        util.logger.info(f'generated {len(array_shells)} array jobs, submit with: bash {submit_shell}')
+        return
+
     makejob_conf = Path('makejob.conf')
 
     with makejob_conf.open('w') as conf:
@@ -68,7 +110,11 @@ def main(**kwargs):
                                                     shell_dir=shell_dir,
                                                     result_dir=result_dir,
                                                     start_col=start_col,
-                                                    sep=sep):
+                                                    sep=sep,
+                                                    compress=kwargs['compress'],
+                                                    min_fraction=kwargs['min_fraction'],
+                                                    cache=cache,
+                                                    top=kwargs['top']):
             conf.write(f'{stat_shell} 1G\n')
             if stat_shells is None:
                 stat_shells = str(stat_shell)
@@ -78,7 +124,11 @@ def main(**kwargs):
         merge_shell = shell.generate_merge_shell(result_dir=result_dir,
                                                  shell_dir=shell_dir,
                                                  merge_dir=merge_dir)
-        conf.write(f'{merge_shell} 1G {stat_shells}\n')
+        if stat_shells is None:
+            # all units were reused from the cache
+            conf.write(f'{merge_shell} 1G\n')
+        else:
+            conf.write(f'{merge_shell} 1G {stat_shells}\n')
 
         plot_shell = shell.generate_plot_shell(output_dir=output_dir,
                                                result_dir=merge_dir,
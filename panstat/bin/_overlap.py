@@ -0,0 +1,40 @@
+
+import click
+
+from panstat.stat import PanStat
+from panstat.stat.overlap import save_overlap
+
+
+__epilog__ = click.style('''\n
+\b
+examples:
+    panstat overlap -h
+    panstat overlap -i input.txt -O overlap
+    panstat overlap -i input.txt -O overlap --triple
+''', fg='green')
+
+
+@click.command(
+    name='overlap',
+    no_args_is_help=True,
+    help=click.style('Calculate genome x genome shared/union/jaccard matrices', italic=True, fg='blue'),
+    epilog=__epilog__,
+)
+@click.option('-i', '--input-file', help='Path to the input data file', type=click.Path(exists=True), required=True)
+@click.option('-O', '--output-dir', help='Path to the output directory', type=click.Path(), default='overlap', show_default=True)
+@click.option('--header', help='Row number to use as the column names', type=int, default=0, show_default=True)
+@click.option('--sep', help='Delimiter to use for reading the input file (e.g., "\\t" for tab)', default='\t')
+@click.option('--start-col', help='Column index to start reading sample data from', default=1, show_default=True, type=int)
+@click.option('--triple', help='Also calculate the shared/union counts of all genome triples', is_flag=True)
+@click.option('--block-size', help='Number of rows per block of the matrix product', type=int, default=1 << 16, show_default=True)
+def main(**kwargs):
+    ps = PanStat(input_file=kwargs['input_file'],
+                 num_samples=2,
+                 share_type='intersection',
+                 header=kwargs['header'],
+                 sep=kwargs['sep'],
+                 start_col=kwargs['start_col'])
+    df = ps.load_frame()
+    samples = df.columns[ps.start_col:]
+    save_overlap((df[samples] > 0).to_numpy(), samples, kwargs['output_dir'],
+                 triple=kwargs['triple'], block_size=kwargs['block_size'])
@@ -17,6 +17,7 @@ examples:
     panstat plot out/result --write pointplot.R
     panstat plot out/result --write pointplot.R --option x_lab=XXX --option width=30 --option dpi=500
     panstat plot out/result --write boxplot.R --plot-type box 
+    panstat plot spectrum/curves.tsv [processed file, eg. from panstat spectrum]
 
 \b
 default options:
@@ -62,13 +63,19 @@ def main(**kwargs):
     plot_type = kwargs['plot_type']
 
     options = dict(option.split('=') for option in kwargs['option'])
-    processed_file = options.get('infile', f'processed_stats.{plot_type}.tsv')
+    if os.path.isfile(kwargs['result_dir']):
+        # an already processed file in point format, eg. curves.tsv from `panstat spectrum`
+        if plot_type != 'point':
+            raise click.UsageError('a processed file is only supported with --plot-type point')
+        processed_file = kwargs['result_dir']
+    else:
+        processed_file = options.get('infile', f'processed_stats.{plot_type}.tsv')
+        stat_from_result(kwargs['result_dir'], outfile=processed_file, plot_type=plot_type)
 
-    stat_from_result(kwargs['result_dir'], outfile=processed_file, plot_type=plot_type)
     if plot_type == 'point':
-        r_code = generate_pointplot_r_code(**{'infile': processed_file, **options})
+        r_code = generate_pointplot_r_code(**{**options, 'infile': processed_file})
     else:
-        r_code = generate_boxplot_r_code(**{'infile': processed_file, **options})
+        r_code = generate_boxplot_r_code(**{**options, 'infile': processed_file})
 
     with open(kwargs['write'], 'w') as f:
         f.write(r_code)
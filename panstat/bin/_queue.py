@@ -0,0 +1,104 @@
+from pathlib import Path
+
+import click
+import pandas as pd
+
+from panstat import util
+from panstat.util import shell
+from panstat.util.cache import ResultCache
+from panstat.util.workqueue import open_queue, run_worker
+
+
+__epilog__ = click.style('''\n
+\b
+examples:
+    panstat queue -h
+    panstat queue init -i input.txt -t 200000 -O out queue_dir
+    panstat queue init -i input.txt -t 200000 -O out queue.db
+    panstat queue work queue_dir                        [run on any node sharing the queue_dir]
+    panstat queue status queue_dir
+''', fg='green')
+
+
+@click.group(
+    name='queue',
+    no_args_is_help=True,
+    help=click.style('Dynamic work queue for multi-node runs', italic=True, fg='blue'),
+    epilog=__epilog__,
+)
+def main():
+    pass
+
+
+@main.command(name='init', no_args_is_help=True, help='Plan the work units of a batch run into a queue')
+@click.argument('queue')
+@click.option('-i', '--input-file', help='Path to the input data file', type=click.Path(exists=True), required=True)
+@click.option('-sep', '--sep', help='Delimiter to use for reading the input file (e.g., "\\t" for tab)', default='\t')
+@click.option('-s', '--start-col', help='Column index to start reading sample data from', default=1, show_default=True, type=int)
+@click.option('-t', '--threshold', help='The threshold to divide the combinations', type=int, default=200000, show_default=True)
+@click.option('-O', '--output-dir', help='Path to the output directory', type=click.Path(), default='.', show_default=True)
+@click.option('--compress', help='Compress the stat result files', type=click.Choice(['gzip', 'xz', 'zstd']), show_choices=True)
+@click.option('--min-fraction', help='Also compute soft-core (quorum) statistics with this min fraction of genomes', type=click.FloatRange(0, 1, min_open=True))
+@click.option('--top', help='Report the N combinations with the smallest and largest counts per k', type=click.IntRange(min=1))
+@click.option('--cache-dir', help='Directory of the result cache, cached units are reused instead of queued',
+              type=click.Path(), envvar='PANSTAT_CACHE_DIR')
+@click.option('--cache-size', help='Max size of the result cache in GB, least recently used results are evicted', type=float)
+def init_cli(**kwargs):
+    input_file = kwargs['input_file']
+    start_col = kwargs['start_col']
+    sep = kwargs['sep']
+
+    header = next(pd.read_csv(input_file, sep=sep, chunksize=1))
+    sample_count = header.columns[start_col:].size
+
+    util.logger.debug(f'>>> Found {sample_count} samples in {input_file}')
+
+    chunkcounts = util.dynamic_chunkcount(sample_count, threshold=kwargs['threshold'])
+
+    total_lines = pd.read_csv(input_file).size
+
+    result_dir = Path(kwargs['output_dir']).resolve() / 'result'
+
+    meta = {
+        'input_file': str(Path(input_file).resolve()),
+        'sep': sep,
+        'start_col': start_col,
+        'compress': kwargs['compress'],
+        'result_dir': str(result_dir),
+        'cache_dir': kwargs['cache_dir'] and str(Path(kwargs['cache_dir']).resolve()),
+        'cache_size': kwargs['cache_size'],
+        'top': kwargs['top'],
+    }
+    units = shell.iter_stat_units(chunkcounts, total_lines, result_dir, kwargs['compress'], kwargs['min_fraction'])
+
+    cache = ResultCache.from_options(kwargs['cache_dir'], kwargs['cache_size'])
+    if cache:
+        units = cache.pending_units(units, input_file, header.columns[start_col:], kwargs['compress'], kwargs['top'])
+    units = list(units)
+
+    work_queue = open_queue(kwargs['queue'])
+    work_queue.init(meta, units)
+
+    util.logger.info(f'queued {len(units)} units to: {kwargs["queue"]}')
+
+
+@main.command(name='work', no_args_is_help=True, help='Claim and compute units until the queue is drained')
+@click.argument('queue')
+@click.option('--worker', help='Name of the worker  [default: hostname:pid]')
+@click.option('--heartbeat', help='Seconds between two heartbeats', type=float, default=30, show_default=True)
+@click.option('--stale-timeout', help='Seconds without heartbeat after which a unit is requeued', type=float, default=300,
+              show_default=True)
+@click.option('--max-units', help='Stop after computing this number of units', type=int)
+def work_cli(**kwargs):
+    run_worker(open_queue(kwargs['queue']),
+               worker=kwargs['worker'],
+               heartbeat_interval=kwargs['heartbeat'],
+               stale_timeout=kwargs['stale_timeout'],
+               max_units=kwargs['max_units'])
+
+
+@main.command(name='status', no_args_is_help=True, help='Show the number of units per state')
+@click.argument('queue')
+def status_cli(**kwargs):
+    status = open_queue(kwargs['queue']).status()
+    click.echo('\t'.join(f'{state}: {count}' for state, count in status.items()))
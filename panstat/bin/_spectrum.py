@@ -0,0 +1,39 @@
+import click
+
+from panstat.stat.spectrum import CLASS_THRESHOLDS, save_spectrum
+
+
+__epilog__ = click.style('''\n
+\b
+examples:
+    panstat spectrum -h
+    panstat spectrum -i input.txt -O spectrum
+    panstat spectrum -i input.txt -O spectrum --core 1 --soft-core 0.95 --shell 0.15
+    panstat plot spectrum/curves.tsv [expected core/pan curves]
+''', fg='green')
+
+
+@click.command(
+    name='spectrum',
+    no_args_is_help=True,
+    help=click.style('Calculate per-gene presence counts, the frequency spectrum and core/soft-core/shell/cloud classes',
+                     italic=True, fg='blue'),
+    epilog=__epilog__,
+)
+@click.option('-i', '--input-file', help='Path to the input data file', type=click.Path(exists=True), required=True)
+@click.option('-O', '--output-dir', help='Path to the output directory', type=click.Path(), default='spectrum', show_default=True)
+@click.option('--header', help='Row number to use as the column names', type=int, default=0, show_default=True)
+@click.option('--sep', help='Delimiter to use for reading the input file (e.g., "\\t" for tab)', default='\t')
+@click.option('--start-col', help='Column index to start reading sample data from', default=1, show_default=True, type=int)
+@click.option('--chunksize', help='Number of rows read per chunk', type=int, default=1 << 16, show_default=True)
+@click.option('--core', help='Min fraction of genomes for core genes', type=float, default=CLASS_THRESHOLDS['core'], show_default=True)
+@click.option('--soft-core', help='Min fraction of genomes for soft-core genes', type=float, default=CLASS_THRESHOLDS['soft-core'], show_default=True)
+@click.option('--shell', help='Min fraction of genomes for shell genes, the rest are cloud genes', type=float, default=CLASS_THRESHOLDS['shell'], show_default=True)
+def main(**kwargs):
+    thresholds = {name: kwargs[name.replace('-', '_')] for name in CLASS_THRESHOLDS}
+    save_spectrum(kwargs['input_file'], kwargs['output_dir'],
+                  header=kwargs['header'],
+                  sep=kwargs['sep'],
+                  start_col=kwargs['start_col'],
+                  chunksize=kwargs['chunksize'],
+                  thresholds=thresholds)
@@ -1,7 +1,9 @@
 
 import click
 
+from panstat import util
 from panstat.stat import PanStat
+from panstat.util.cache import ResultCache
 
 
 __epilog__ = click.style('''\n
@@ -10,8 +12,29 @@ examples:
     panstat stat -h
     panstat stat -i input.txt -o output.txt -n 13 -t intersection
     panstat stat -i input.txt -o output.txt -n 13 -t intersection --chunksize 100 --chunk 2 [read 101-200 lines]
+    panstat stat -i input.txt -o output.txt -n 13 -t intersection --compress gzip [save to output.txt.gz]
+    panstat stat -i input.txt -o output.txt -n 13 -t intersection --update previous.txt [new genomes appended to input.txt]
+    panstat stat -i input.txt -o output.txt -n 13 -t quorum --min-fraction 0.95 [present in at least 95% of the 13 genomes]
+    panstat stat -i input.txt --groups metadata.tsv --result-dir result [all k and share types, per group]
+    panstat stat -i input.txt -o output.txt -n 13 -t intersection --cache-dir ~/.panstat_cache --cache-size 50
+    panstat stat -i input.txt -o output.txt -n 13 -t intersection --top 10 [save output.extremes.tsv]
+    panstat stat -i input.txt -o output.txt -n 13 -t intersection --max-memory 16
 ''', fg='green')
 
+
+def check_group_options():
+    """
+    Reject the options that --groups does not support, instead of ignoring them.
+    """
+    ctx = click.get_current_context()
+    for name in ('output_file', 'update', 'max_memory', 'tmp_dir', 'cache_dir', 'cache_size'):
+        source = ctx.get_parameter_source(name)
+        if source == click.core.ParameterSource.ENVIRONMENT:
+            util.logger.warning(f'--{name.replace("_", "-")} from the environment is not used with --groups')
+        elif source == click.core.ParameterSource.COMMANDLINE:
+            raise click.UsageError(f'--{name.replace("_", "-")} is not supported with --groups')
+
+
 @click.command(
     name='stat',
     no_args_is_help=True,
@@ -20,15 +43,42 @@ examples:
 )
 @click.option('-i', '--input-file', help='Path to the input data file', type=click.Path(exists=True), required=True)
 @click.option('-o', '--output-file', help='Path where the results will be saved', type=click.Path(), default='output_stat.txt', show_default=True)
-@click.option('-n', '--num-samples', help='Number of samples to compute', type=int, required=True)
-@click.option('-t', '--share_type', help='Type of share to compute', type=click.Choice(['intersection', 'union']), show_choices=True)
+@click.option('-n', '--num-samples', help='Number of samples to compute  [required without --groups]', type=int)
+@click.option('-t', '--share_type', help='Type of share to compute', type=click.Choice(['intersection', 'union', 'quorum']), show_choices=True)
+@click.option('--min-fraction', help='For quorum, the min fraction of genomes in a combination a gene must be present in', type=click.FloatRange(0, 1, min_open=True))
 @click.option('--header', help='Row number to use as the column names', type=int, default=0, show_default=True)
 @click.option('--sep', help='Delimiter to use for reading the input file (e.g., "\\t" for tab)', default='\t')
 @click.option('--start-col', help='Column index to start reading sample data from', default=1, show_default=True, type=int)
 @click.option('--show-progress', help='Show progress', type=click.BOOL, default=True)
 @click.option('--chunksize', help='The chunksize lines to read', type=int)
 @click.option('--chunk', help='The index of chunk', type=int)
+@click.option('--compress', help='Compress the result file', type=click.Choice(['gzip', 'xz', 'zstd']), show_choices=True)
+@click.option('--update', help='Previous result of the same k and share type, computed before new genome columns were '
+                                'appended to the input, only combinations including new genomes are computed',
+              type=click.Path(exists=True))
+@click.option('--groups', help='Metadata file with sample and group columns, compute statistics per group into '
+                                'subdirectories of --result-dir', type=click.Path(exists=True))
+@click.option('--result-dir', help='The result directory for --groups', type=click.Path(), default='result', show_default=True)
+@click.option('--max-memory', help='Memory budget in GB, stream the packed input in row blocks in one process', type=float)
+@click.option('--tmp-dir', help='Directory of the temporary packed input for --max-memory', type=click.Path())
+@click.option('--top', help='Report the N combinations with the smallest and largest counts beside the result', type=click.IntRange(min=1))
+@click.option('--cache-dir', help='Directory of the result cache, finished units are reused instead of recomputed',
+              type=click.Path(), envvar='PANSTAT_CACHE_DIR')
+@click.option('--cache-size', help='Max size of the result cache in GB, least recently used results are evicted', type=float)
+@click.option('--block-size', help='Number of results formatted and written per block', type=int, default=1 << 20, show_default=True)
 def main(**kwargs):
+    if not kwargs['num_samples'] and not kwargs['groups']:
+        raise click.UsageError('Missing option "-n" / "--num-samples"')
+    if kwargs['share_type'] == 'quorum' and not kwargs['min_fraction']:
+        raise click.UsageError('Missing option "--min-fraction" for -t quorum')
+
+    if kwargs['groups']:
+        check_group_options()
+
     ps = PanStat(**kwargs)
-    results = ps.compute()
-    ps.save(results, kwargs['output_file'])
+    if kwargs['groups']:
+        ps.compute_groups(kwargs['result_dir'])
+        return
+
+    cache = ResultCache.from_options(kwargs['cache_dir'], kwargs['cache_size'])
+    ps.run(kwargs['output_file'], cache=cache)
@@ -0,0 +1,60 @@
+import csv
+
+import click
+
+from panstat import util
+from panstat.stat import PanStat
+from panstat.util.cache import ResultCache
+
+
+__epilog__ = click.style('''\n
+\b
+examples:
+    panstat task -h
+    panstat task shell/array/params.k13.tsv --index $SLURM_ARRAY_TASK_ID -i input.txt
+    panstat task shell/array/params.k13.tsv --index $SGE_TASK_ID --pack 10 -i input.txt
+''', fg='green')
+
+
+@click.command(
+    name='task',
+    no_args_is_help=True,
+    help=click.style('Run the units of an array task from a parameter table', italic=True, fg='blue'),
+    epilog=__epilog__,
+)
+@click.argument('params_file', type=click.Path(exists=True))
+@click.option('--index', help='The 1-based task index', type=int, required=True)
+@click.option('--pack', help='Number of units per task, the task runs rows [(index-1)*pack, index*pack)', type=click.IntRange(min=1),
+              default=1, show_default=True)
+@click.option('-i', '--input-file', help='Path to the input data file', type=click.Path(exists=True), required=True)
+@click.option('--sep', help='Delimiter to use for reading the input file (e.g., "\\t" for tab)', default='\t')
+@click.option('--start-col', help='Column index to start reading sample data from', default=1, show_default=True, type=int)
+@click.option('--compress', help='Compress the result file', type=click.Choice(['gzip', 'xz', 'zstd']), show_choices=True)
+@click.option('--top', help='Report the N combinations with the smallest and largest counts beside the result', type=click.IntRange(min=1))
+@click.option('--cache-dir', help='Directory of the result cache', type=click.Path(), envvar='PANSTAT_CACHE_DIR')
+@click.option('--cache-size', help='Max size of the result cache in GB', type=float)
+def main(**kwargs):
+    index, pack = kwargs['index'], kwargs['pack']
+
+    with open(kwargs['params_file']) as f:
+        rows = list(csv.DictReader(f, delimiter='\t'))[(index - 1) * pack:index * pack]
+
+    if not rows:
+        raise click.BadParameter(f'no units for task {index} in {kwargs["params_file"]}', param_hint='--index')
+
+    cache = ResultCache.from_options(kwargs['cache_dir'], kwargs['cache_size'])
+
+    for row in rows:
+        util.logger.info(f'>>> task {index}: unit {row["name"]}')
+        ps = PanStat(input_file=kwargs['input_file'],
+                     num_samples=int(row['num_samples']),
+                     share_type=row['share_type'],
+                     min_fraction=float(row['min_fraction']) if row['min_fraction'] else None,
+                     sep=kwargs['sep'],
+                     start_col=kwargs['start_col'],
+                     show_progress=False,
+                     chunksize=int(row['chunksize']),
+                     chunk=int(row['chunk']),
+                     compress=kwargs['compress'],
+                     top=kwargs['top'])
+        ps.run(row['output_file'], cache=cache)
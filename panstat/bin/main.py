@@ -5,6 +5,10 @@ from ._stat import main as stat_cli
 from ._plot import main as plot_cli
 from ._batch import main as batch_cli
 from ._merge import main as merge_cli
+from ._queue import main as queue_cli
+from ._overlap import main as overlap_cli
+from ._task import main as task_cli
+from ._spectrum import main as spectrum_cli
 
 
 CONTEXT_SETTINGS = dict(
@@ -37,6 +41,10 @@ def main():
     cli.add_command(plot_cli)
     cli.add_command(batch_cli)
     cli.add_command(merge_cli)
+    cli.add_command(queue_cli)
+    cli.add_command(overlap_cli)
+    cli.add_command(task_cli)
+    cli.add_command(spectrum_cli)
     cli()
 
 
@@ -5,11 +5,12 @@ options(warn=-1)
 
 library(ggplot2)
                              
-default_colors <- scale_color_discrete()$$palette(2)
 legend_title <- '${legend_title}'
 
 data <- read.csv('${infile}', sep='\\t', check.names=F)
 
+default_colors <- scale_color_discrete()$$palette(length(unique(data$$share_type)))
+
 p <- ggplot(data, aes(x=as.factor(share_count), y=mean, fill=share_type)) +
     geom_boxplot(
         aes(ymin=min, lower=p25, middle=p50, upper=p75, ymax=max),
@@ -5,11 +5,12 @@ options(warn=-1)
 
 library(ggplot2)
                              
-default_colors <- scale_color_discrete()$$palette(2)
 legend_title <- '${legend_title}'
 
 data <- read.csv('${infile}', sep='\\t', check.names=F)
 
+default_colors <- scale_color_discrete()$$palette(length(unique(data$$share_type)))
+
 p <- ggplot(data, aes(x=as.factor(share_count), y=value, color=share_type, shape=share_type)) +
     geom_point(alpha=0.6, size=3) +                     
     geom_smooth(
@@ -27,7 +28,7 @@ p <- ggplot(data, aes(x=as.factor(share_count), y=value, color=share_type, shape
         axis.line=element_line(colour='black')
     ) +
     scale_color_manual(name=legend_title, values=default_colors) +
-    scale_shape_manual(name=legend_title, values=c(16, 17))
+    scale_shape_manual(name=legend_title, values=c(16, 17, 15))
 
 ggsave(filename='${output}.png', plot=p, dpi=${dpi}, type='cairo', width=${width}, height=${height})
 cat('\\x1b[32msaved png file to: ${output}.png\\x1b[0m\\n')
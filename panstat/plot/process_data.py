@@ -4,13 +4,14 @@ from pathlib import Path
 import pandas as pd
 
 from panstat import util
+from panstat.util.writer import load_result, result_files
 
 
 def stat_from_result(result_dir: str, outfile: str = 'processed_stats.tsv', plot_type: Literal['point', 'box'] = 'points'):
     """
     Process and aggregate statistics from result files located in the specified directory.
 
-    This function reads individual text files from subdirectories (starting with 'x' or 'y')
+    This function reads individual text files from subdirectories (starting with 'x', 'y' or 's')
     in the given result directory, aggregates the data, and computes descriptive statistics 
     (mean, min, percentiles, max). The aggregated statistics are then written to a TSV outfile.
 
@@ -24,8 +25,8 @@ def stat_from_result(result_dir: str, outfile: str = 'processed_stats.tsv', plot
     - str: The name of the output file with aggregated statistics.
 
     Note:
-    The function expects the result directory to contain subdirectories starting with 'x' or 'y',
-    and each subdirectory should contain '.txt' files with the data.
+    The function expects the result directory to contain subdirectories starting with 'x', 'y' or 's',
+    and each subdirectory should contain '.txt' files (optionally compressed, eg. '.txt.gz') with the data.
     """
 
     result_dir = Path(result_dir)
@@ -40,15 +41,14 @@ def stat_from_result(result_dir: str, outfile: str = 'processed_stats.tsv', plot
     with open(outfile, 'w') as out:
         out.write('\t'.join(columns) + '\n')
 
-        for p in (result_dir.glob('[xy]*')):
-            share_type = p.name[0]
-            share_type = 'core' if share_type == 'x' else 'pan'
+        for p in util.result_dirs(result_dir):
+            share_type = util.SHARE_NAMES[p.name[0]]
             share_count = p.name[1:]
 
             sum_df = None
-            for file in p.glob('*.txt'):
+            for file in result_files(p):
                 util.logger.debug(f'stat from file: {file}')
-                df = pd.read_csv(file, header=None, names=['x']).x
+                df = pd.Series(load_result(file), name='x')
                 if sum_df is None:
                     sum_df = df
                 else:
@@ -1,12 +1,19 @@
 import math
-import itertools
+import heapq
 import pathlib
+import itertools
 from typing import Iterable, Literal, Optional, Tuple, Union, Set, Dict
 
 import tqdm
+import numpy as np
 import pandas as pd
 
 from panstat import util
+from panstat.util.cache import ResultCache, row_range
+from panstat.util.extremes import ExtremesTracker, extremes_path, save_extremes
+from panstat.util.bitset import VerticalCounter, pack_presence, popcount
+from panstat.util.writer import ResultWriter, open_result, result_path
+from . import overlap, blocked
 
 
 class PanStat(object):
@@ -17,23 +24,40 @@ class PanStat(object):
         input_file (Path): Path to the input data file.
         output_file (Path): Path where the results will be saved.
         num_samples (int): Number of samples to compute.
-        share_type (str): Type of share to compute ('intersection' or 'union').
+        share_type (str): Type of share to compute ('intersection', 'union' or 'quorum').
+        min_fraction (float): For 'quorum', the minimum fraction of samples in a combination a gene must be present in.
         header (int): Row number to use as the column names.
         sep (str): Delimiter to use for reading the input file.
         start_col (int): Column index to start reading sample data from.
         show_progress (bool): Flag to indicate if a progress bar should be displayed.
+        compress (str): Compression of the result file ('gzip', 'xz', 'zstd' or None).
+        block_size (int): Number of results formatted and written per block.
+        update (str): Path to a previous result computed before new genome columns were appended to the input,
+            only the combinations including at least one new genome are computed.
+        groups (str): Path to a metadata file of (sample, group) rows, see `compute_groups`.
+        top (int): Number of combinations with the smallest and largest counts to report beside the result.
+        max_memory (float): Memory budget in GB, stream the packed input in row blocks instead of loading it, see `compute_blocked`.
+        tmp_dir (str): Directory of the temporary packed input for `max_memory`.
     """
 
     def __init__(self,
                  input_file: str,
                  num_samples: int,
-                 share_type: Literal['intersection', 'union'],
+                 share_type: Literal['intersection', 'union', 'quorum'],
                  header: Optional[int] = 0,
                  sep: str = '\t',
                  start_col: int = 1,
                  show_progress: Optional[bool] = True,
                  chunksize: Optional[int] = None,
                  chunk: Optional[int] = None,
+                 compress: Optional[Literal['gzip', 'xz', 'zstd']] = None,
+                 block_size: int = 1 << 20,
+                 update: Optional[str] = None,
+                 min_fraction: Optional[float] = None,
+                 groups: Optional[str] = None,
+                 top: Optional[int] = None,
+                 max_memory: Optional[float] = None,
+                 tmp_dir: Optional[str] = None,
                  **kwargs,
                  ):
         self.input_file = input_file
@@ -45,17 +69,37 @@ class PanStat(object):
         self.show_progress = show_progress
         self.chunksize = chunksize
         self.chunk = chunk
+        self.compress = compress
+        self.block_size = block_size
+        self.update = update
+        self.min_fraction = min_fraction
+
+        self.groups = groups
+        self.top = top
+        self.max_memory = max_memory
+        self.tmp_dir = tmp_dir
+
+        if share_type == 'quorum' or min_fraction is not None:
+            if not min_fraction or not 0 < min_fraction <= 1:
+                raise ValueError(f'min_fraction must be in (0, 1] for quorum, got: {min_fraction}')
 
         self.combinations_length = None
+        self.samples = None
 
-    def load_data(self) -> Tuple[Dict[str, Set[int]], Iterable[Tuple], int]:
+    @property
+    def quorum(self) -> int:
         """
-        Load data from the input file and prepare sample combinations.
+        The min number of samples of a combination for 'quorum'.
+        """
+        # round off float noise, eg. 0.7 * 10 = 7.000000000000001
+        return math.ceil(round(self.min_fraction * self.num_samples, 9))
+
+    def load_frame(self) -> pd.DataFrame:
+        """
+        Load the input file (or the chunk of it) as a DataFrame.
 
         Returns:
-            Tuple containing:
-                - data_sets (Dict[str, Set[int]]): Dictionary with sample names as keys and corresponding data sets as values.
-                - sample_combinations (Iterable[Tuple]): Combinations of sample names.
+            pd.DataFrame: The input data, sample columns start from `start_col`.
         """
         self.sep = '\t' if self.sep == '\\t' else self.sep
 
@@ -73,16 +117,49 @@ class PanStat(object):
             util.logger.info(f'load data from file: {self.input_file}')
             df = pd.read_csv(self.input_file, header=self.header, usecols=usecols, sep=self.sep)
 
+        return df
+
+    def load_data(self) -> Tuple[Dict[str, Set[int]], Iterable[Tuple], int]:
+        """
+        Load data from the input file and prepare sample combinations.
+
+        Returns:
+            Tuple containing:
+                - data_sets (Dict[str, Set[int]]): Dictionary with sample names as keys and corresponding data sets as values,
+                  for 'quorum' the values are packed presence bit vectors.
+                - sample_combinations (Iterable[Tuple]): Combinations of sample names.
+        """
+        df = self.load_frame()
+
         samples = df.columns[self.start_col:]
+        self.samples = list(samples)
         combinations = itertools.combinations(samples, self.num_samples)
         self.combinations_length = math.comb(len(samples), self.num_samples)
 
+        return self.build_data_sets(df, samples), combinations
+
+    def build_data_sets(self, df: pd.DataFrame, samples: Iterable[str]) -> Dict[str, Set[int]]:
+        """
+        Build the data set of each sample for the current share type.
+
+        Args:
+            df (pd.DataFrame): The input data.
+            samples (Iterable[str]): The sample columns.
+
+        Returns:
+            Dict[str, Set[int]]: Dictionary with sample names as keys and corresponding data sets as values,
+                for 'quorum' the values are packed presence bit vectors.
+        """
+        if self.share_type == 'quorum':
+            packed = pack_presence((df[samples] > 0).to_numpy())
+            return dict(zip(samples, packed))
+
         # Compute the set of positions where data > 0 for each sample
         data_sets = {
             sample: set(df[df[sample] > 0].index) for sample in samples
         }
 
-        return data_sets, combinations
+        return data_sets
 
     def count_shared(self, sample_sets: Iterable[Set[int]]) -> int:
         """
@@ -94,12 +171,32 @@ class PanStat(object):
         Returns:
             int: Number of shared data points.
         """
+        if self.share_type == 'quorum':
+            return self.count_quorum(sample_sets)
         if self.share_type == 'intersection':
             shared_set = set.intersection(*sample_sets)
         else:
             shared_set = set.union(*sample_sets)
         return len(shared_set)
 
+    def count_quorum(self, sample_vectors: Iterable) -> int:
+        """
+        Count the data present in at least `quorum` samples of the combination.
+
+        The packed vectors are summed into bit-sliced counters, so each sample costs a few
+        word operations per 64 genes instead of a set operation.
+
+        Args:
+            sample_vectors (Iterable[np.ndarray]): Packed presence bit vectors for each sample in the combination.
+
+        Returns:
+            int: Number of data points reaching the quorum.
+        """
+        sample_vectors = list(sample_vectors)
+        counter = VerticalCounter(len(sample_vectors), sample_vectors[0].size)
+        counter.add_all(sample_vectors)
+        return popcount(counter.at_least(self.quorum))
+
     def process_combinations(self, data_sets: Dict[str, Set[int]], combinations: Iterable[Tuple]) -> Iterable[int]:
         """
         Process combinations of samples and compute shared data counts.
@@ -115,6 +212,126 @@ class PanStat(object):
             sample_sets = [data_sets[sample] for sample in combination]
             yield self.count_shared(sample_sets)
 
+    def previous_samples(self, sample_count: int) -> int:
+        """
+        Infer the number of samples of the previous result from its line count, which is C(n, k).
+
+        Args:
+            sample_count (int): Number of samples in the current input.
+
+        Returns:
+            int: Number of samples the previous result was computed with.
+        """
+        with open_result(self.update) as f:
+            lines = sum(1 for _ in f)
+
+        for n in range(self.num_samples, sample_count + 1):
+            if math.comb(n, self.num_samples) == lines:
+                return n
+
+        raise ValueError(f'{self.update} has {lines} lines, which is not C(n, {self.num_samples}) for any n <= {sample_count}')
+
+    def process_update(self, data_sets: Dict[str, Set[int]], previous_file: str) -> Iterable[int]:
+        """
+        Merge a previous result with the combinations including at least one new sample.
+
+        The new samples must be appended after the previous ones, so that the combinations of the previous
+        samples keep their relative order. The combinations including new sample j are enumerated as
+        (prefix + (j,)) for each prefix of the samples before j, and are merged with the previous counts in
+        the lexicographic order of `itertools.combinations`, so the output is the same as a full recompute.
+
+        Args:
+            data_sets (Dict[str, Set[int]]): Dictionary with sample names as keys and corresponding data sets as values.
+            previous_file (str): Path to the previous result.
+
+        Returns:
+            Iterable[int]: Shared data counts for each combination.
+        """
+        samples = list(data_sets)
+        sample_count = len(samples)
+        previous_count = self.previous_samples(sample_count)
+
+        util.logger.info(f'update {previous_file}: {previous_count} previous samples, {sample_count - previous_count} new samples')
+
+        k = self.num_samples
+
+        with open_result(previous_file) as f:
+            previous = zip(itertools.combinations(range(previous_count), k), (int(line) for line in f))
+            def with_sample(j):
+                for prefix in itertools.combinations(range(j), k - 1):
+                    yield (*prefix, j), None
+
+            # one sorted stream per new sample
+            added = [with_sample(j) for j in range(previous_count, sample_count)]
+
+            for combination, count in heapq.merge(previous, *added, key=lambda item: item[0]):
+                if count is None:
+                    count = self.count_shared([data_sets[samples[i]] for i in combination])
+                yield count
+
+    def compute_pairs(self) -> Iterable[int]:
+        """
+        Compute the counts of all sample pairs from one blocked matrix product X^T X instead of enumeration.
+
+        For 'quorum', a pair reaching a quorum of 1 is its union, otherwise its intersection.
+
+        Returns:
+            Iterable[int]: Shared data counts for each pair of samples.
+        """
+        df = self.load_frame()
+        samples = df.columns[self.start_col:]
+        self.samples = list(samples)
+        self.combinations_length = math.comb(len(samples), 2)
+
+        return self.pair_results(df, samples)
+
+    def pair_results(self, df: pd.DataFrame, samples: Iterable[str]) -> np.ndarray:
+        """
+        Counts of all pairs of the given sample columns, in combinations order.
+        """
+        share_type = self.share_type
+        if share_type == 'quorum':
+            share_type = 'union' if self.quorum == 1 else 'intersection'
+
+        return overlap.pair_counts((df[list(samples)] > 0).to_numpy(), share_type=share_type)
+
+    def compute_blocked(self) -> np.ndarray:
+        """
+        Compute the counts of all combinations in one process within `max_memory`.
+
+        The input (or the chunk of it) is streamed into a packed presence file, which is then read back
+        through mmap in row blocks, the counts of every combination are accumulated across blocks. Only
+        the counter array, sized from `math.comb`, and the current block are held in memory.
+
+        Returns:
+            np.ndarray: Shared data counts for each combination of samples.
+        """
+        self.sep = '\t' if self.sep == '\\t' else self.sep
+
+        header_row = pd.read_csv(self.input_file, sep=self.sep, header=self.header, nrows=0).columns
+        self.samples = list(header_row[self.start_col:])
+        self.combinations_length = math.comb(len(self.samples), self.num_samples)
+
+        read_options = dict(sep=self.sep, header=self.header, usecols=range(header_row.size),
+                            chunksize=blocked.read_chunksize(header_row.size, self.max_memory))
+        if self.chunk and self.chunksize:
+            util.logger.info(f'stream data from file: {self.input_file} [chunk: {self.chunk}, chunksize: {self.chunksize}]')
+            first = 0 if self.header is None else self.header + 1
+            skiprows = range(first, first + (self.chunk - 1) * self.chunksize)
+            chunks = pd.read_csv(self.input_file, skiprows=skiprows, nrows=self.chunksize, **read_options)
+        else:
+            util.logger.info(f'stream data from file: {self.input_file}')
+            chunks = pd.read_csv(self.input_file, **read_options)
+
+        return blocked.compute_blocked(chunks,
+                                       samples=len(self.samples),
+                                       start_col=self.start_col,
+                                       num_samples=self.num_samples,
+                                       share_type=self.share_type,
+                                       max_memory=self.max_memory,
+                                       quorum=self.quorum if self.share_type == 'quorum' else None,
+                                       tmp_dir=self.tmp_dir)
+
     def compute(self) -> Iterable[int]:
         """
         Compute shared data counts for each combination of samples.
@@ -127,34 +344,188 @@ class PanStat(object):
         Returns:
             Iterable[int]: Shared data counts for each combination of samples.
         """
+        if self.max_memory and not self.update:
+            return self.compute_blocked()
+
+        if self.num_samples == 2 and not self.update:
+            return self.compute_pairs()
+
         data_sets, combinations = self.load_data()
+        if self.update:
+            return self.process_update(data_sets, self.update)
         results = self.process_combinations(data_sets, combinations)
         return results
 
+    def load_groups(self, samples: Iterable[str]) -> Dict[str, list]:
+        """
+        Load the groups from the metadata file.
+
+        The metadata file is tab separated with the sample name in the first column and the group
+        in the second one, rows of unknown samples (eg. a header line) are skipped.
+
+        Args:
+            samples (Iterable[str]): The sample columns of the input data.
+
+        Returns:
+            Dict[str, list]: Dictionary with group names as keys and the samples of the group, in input order, as values.
+        """
+        meta = pd.read_csv(self.groups, sep='\t', header=None, usecols=[0, 1], names=['sample', 'group'], dtype=str)
+
+        unknown = meta[~meta['sample'].isin(samples)]
+        if not unknown.empty:
+            util.logger.warning(f'skip {len(unknown)} rows of unknown samples in {self.groups}: {unknown["sample"].tolist()[:5]}')
+
+        sample_groups = dict(zip(meta['sample'], meta['group']))
+        groups = {}
+        for sample in samples:
+            if sample in sample_groups:
+                groups.setdefault(sample_groups[sample], []).append(sample)
+
+        util.logger.info(f'found {len(groups)} groups: {", ".join(f"{g}({len(s)})" for g, s in groups.items())}')
+
+        return groups
+
+    def compute_groups(self, result_dir: str = 'result') -> Dict[str, list]:
+        """
+        Compute the statistics of each group from one loaded matrix.
+
+        The input is read (and the data sets are built) once, the combinations of each group are
+        restricted to the group's columns. Results are saved into the result layout under one
+        subdirectory per group, eg. `result/<group>/x3/x3_1.txt`.
+
+        If `num_samples` is not set, all sizes from 2 to the group size are computed; if `share_type`
+        is not set, 'intersection' and 'union' (and 'quorum' if `min_fraction` is set) are computed.
+
+        Args:
+            result_dir (str): The result directory.
+
+        Returns:
+            Dict[str, list]: Dictionary with group names as keys and the saved files as values.
+        """
+        df = self.load_frame()
+        groups = self.load_groups(df.columns[self.start_col:])
+        # only the samples of some group are needed, in input order
+        grouped = set(itertools.chain.from_iterable(groups.values()))
+        samples = [sample for sample in df.columns[self.start_col:] if sample in grouped]
+
+        if self.share_type:
+            share_types = [self.share_type]
+        else:
+            share_types = ['intersection', 'union'] + (['quorum'] if self.min_fraction else [])
+
+        # the unit attributes are switched per group and k, and restored afterwards
+        state = self.share_type, self.num_samples, self.samples, self.combinations_length
+        num_samples = self.num_samples
+
+        saved = {}
+        try:
+            for share_type in share_types:
+                self.share_type = share_type
+                prefix = util.SHARE_PREFIXES[share_type]
+                data_sets = None
+
+                for group, group_samples in groups.items():
+                    group_dir = pathlib.Path(result_dir) / group.replace('/', '_')
+                    sizes = [num_samples] if num_samples else range(2, len(group_samples) + 1)
+
+                    for k in sizes:
+                        if k > len(group_samples):
+                            util.logger.warning(f'skip k={k} for group {group} with {len(group_samples)} samples')
+                            continue
+
+                        self.num_samples = k
+                        self.samples = group_samples
+                        self.combinations_length = math.comb(len(group_samples), k)
+                        util.logger.info(f'>>> group: {group}, share_type: {share_type}, num_samples: {k}')
+
+                        if k == 2:
+                            results = self.pair_results(df, group_samples)
+                        else:
+                            if data_sets is None:
+                                data_sets = self.build_data_sets(df, samples)
+                            results = self.process_combinations(data_sets, itertools.combinations(group_samples, k))
+
+                        output_file = group_dir / f'{prefix}{k}' / f'{prefix}{k}_{self.chunk or 1}.txt'
+                        saved.setdefault(group, []).append(self.save(results, output_file))
+        finally:
+            self.share_type, self.num_samples, self.samples, self.combinations_length = state
+
+        return saved
+
+    def cache_key(self, cache: ResultCache) -> str:
+        """
+        Build the cache key of this unit from the input hash, the sample columns, k, share type and row range.
+        """
+        self.sep = '\t' if self.sep == '\\t' else self.sep
+        info = cache.input_info(self.input_file)
+        samples = pd.read_csv(self.input_file, sep=self.sep, header=self.header, nrows=0).columns[self.start_col:]
+        return cache.key(info['hash'], samples, self.num_samples, self.share_type,
+                         rows=row_range(info['rows'], self.chunksize, self.chunk),
+                         min_fraction=self.min_fraction,
+                         compress=self.compress)
+
+    def run(self, output_file: str, cache: Optional[ResultCache] = None) -> pathlib.Path:
+        """
+        Compute and save the results, reusing the cached result of the same unit if there is one.
+
+        Args:
+            output_file (str): The path to the output file where the results should be saved.
+            cache (ResultCache, optional): The result cache, ignored for `update`.
+
+        Returns:
+            Path: The path of the saved file.
+        """
+        if cache is None or self.update:
+            return self.save(self.compute(), output_file)
+
+        key = self.cache_key(cache)
+        output_path = result_path(output_file, self.compress)
+        if cache.fetch_unit(key, output_path, self.top):
+            return output_path
+
+        output_path = self.save(self.compute(), output_path)
+        cache.put(key, output_path)
+        if self.top:
+            cache.put(cache.extremes_key(key, self.top), extremes_path(output_path))
+        return output_path
+
     def save(self, results: Iterable[int], output_file: str):
         """
         Save the computed results to a specified output file.
 
+        If `top` is set, the combinations with the smallest and largest counts are tracked while writing
+        and saved with their sample names beside the result, eg. x13_1.txt -> x13_1.extremes.tsv.
+
         Args:
             results (Iterable[int]): The computed shared data counts for each combination.
-            output_file (str): The path to the output file where the results should be saved.
+            output_file (str): The path to the output file where the results should be saved,
+                the suffix of the compression is appended if missing.
+
+        Returns:
+            Path: The path of the saved file.
         """
         util.logger.debug('start saving result ...')
 
-        if self.show_progress:
+        tracker = None
+        if self.top:
+            tracker = ExtremesTracker(self.top)
+            if isinstance(results, np.ndarray):
+                results = tracker.track_array(results)
+            else:
+                results = tracker.track(results)
+
+        # arrays (eg. from compute_pairs) are written block by block without iterating
+        if self.show_progress and not isinstance(results, np.ndarray):
             results = tqdm.tqdm(results, desc='Processing combinations', unit='lines', total=self.combinations_length)
 
-        output_path = pathlib.Path(output_file)
+        output_path = result_path(output_file, self.compress)
 
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        buffer_size = 1000
-        buffer = []
-        with output_path.open('w') as f:
-            for result in results:
-                buffer.append(f'{result}\n')
-                if len(buffer) >= buffer_size:
-                    f.writelines(buffer)
-                    buffer.clear()
-            f.writelines(buffer)
+        with ResultWriter(output_path, compress=self.compress, block_size=self.block_size) as writer:
+            writer.write(results)
 
         util.logger.info(f'saved to file: {output_path}')
+
+        if tracker:
+            save_extremes(extremes_path(output_path), *tracker.extremes(), self.samples, self.num_samples)
+
+        return output_path
@@ -0,0 +1,193 @@
+import os
+import math
+import tempfile
+from pathlib import Path
+from typing import Iterable, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from panstat import util
+from panstat.util.bitset import VerticalCounter, pack_presence, popcount_columns
+
+
+# bytes per input cell while a chunk is read and packed: the int64 frame, the parser buffers,
+# the bool mask and its padded copy
+READ_CELL_BYTES = 16
+
+
+def read_chunksize(columns: int, max_memory: float) -> int:
+    """
+    The number of rows read per chunk within the memory budget, a multiple of 64 so each chunk packs into whole words.
+
+    Args:
+        columns (int): Number of columns of the input.
+        max_memory (float): The memory budget in GB.
+    """
+    # 64 more bytes per row for the index and the gene name
+    rows = int(max_memory * 1024 ** 3) // (READ_CELL_BYTES * columns + 64)
+    return max(64, rows // 64 * 64)
+
+
+def check_budget(samples: int, num_samples: int, max_memory: float) -> int:
+    """
+    Check that the counts of all combinations fit the memory budget.
+
+    Returns:
+        int: Number of combinations.
+
+    Raises:
+        MemoryError: If the counts alone exceed the budget.
+    """
+    total = math.comb(samples, num_samples)
+    nbytes = total * np.dtype(np.int64).itemsize
+    if nbytes >= max_memory * 1024 ** 3:
+        raise MemoryError(f'the counts of C({samples}, {num_samples}) = {total} combinations need '
+                          f'{nbytes / 1024 ** 2:.1f}M, which exceeds --max-memory {max_memory}G')
+    return total
+
+
+def pack_to_file(chunks: Iterable[pd.DataFrame], start_col: int, path: Union[str, Path]) -> int:
+    """
+    Stream the input chunks into a packed presence file.
+
+    The file is a row-major uint64 matrix of shape (words, samples): word row w holds the presence of
+    genes [64w, 64w + 64) for every sample, so a row block of the matrix is a contiguous slice.
+    Every chunk but the last must have a multiple of 64 rows.
+
+    Args:
+        chunks (Iterable[pd.DataFrame]): The input data chunks.
+        start_col (int): Column index to start reading sample data from.
+        path (str): Path of the packed file.
+
+    Returns:
+        int: Number of samples.
+    """
+    samples = 0
+    with open(path, 'wb') as out:
+        for df in chunks:
+            presence = (df.iloc[:, start_col:] > 0).to_numpy()
+            samples = presence.shape[1]
+            out.write(np.ascontiguousarray(pack_presence(presence).T).tobytes())
+    return samples
+
+
+def count_block(block: np.ndarray,
+                counts: np.ndarray,
+                num_samples: int,
+                share_type: str,
+                quorum: Optional[int] = None):
+    """
+    Accumulate the counts of all combinations over one row block.
+
+    The combinations are traversed depth first, the AND/OR (or the vertical counters for 'quorum')
+    of each prefix is computed once and shared by its children. The combinations sharing a prefix
+    of k-1 samples are contiguous in `itertools.combinations` order, so the last level is one
+    vectorised operation over the remaining samples.
+
+    Args:
+        block (np.ndarray): uint64 matrix of shape (words, samples).
+        counts (np.ndarray): int64 counts of all combinations, updated in place.
+        num_samples (int): Number of samples per combination.
+        share_type (str): 'intersection', 'union' or 'quorum'.
+        quorum (int, optional): The min number of samples for 'quorum'.
+    """
+    samples = block.shape[1]
+
+    if share_type == 'quorum':
+        def extend(state, j):
+            counter = state.copy()
+            counter.add(block[:, j])
+            return counter
+
+        def last(state, start):
+            counter = state.copy((block.shape[0], samples - start))
+            counter.add(block[:, start:])
+            return popcount_columns(counter.at_least(quorum))
+
+        root = VerticalCounter(num_samples, block.shape[0])
+    else:
+        op = np.bitwise_and if share_type == 'intersection' else np.bitwise_or
+
+        def extend(state, j):
+            return block[:, j] if state is None else op(state, block[:, j])
+
+        def last(state, start):
+            rest = block[:, start:]
+            return popcount_columns(rest if state is None else op(state[:, None], rest))
+
+        root = None
+
+    rank = 0
+
+    def visit(state, start, depth):
+        nonlocal rank
+        if depth == num_samples - 1:
+            block_counts = last(state, start)
+            counts[rank:rank + block_counts.size] += block_counts
+            rank += block_counts.size
+            return
+        for j in range(start, samples - (num_samples - 1 - depth)):
+            visit(extend(state, j), j + 1, depth + 1)
+
+    visit(root, 0, 0)
+
+
+def compute_blocked(chunks: Iterable[pd.DataFrame],
+                    samples: int,
+                    start_col: int,
+                    num_samples: int,
+                    share_type: str,
+                    max_memory: float,
+                    quorum: Optional[int] = None,
+                    tmp_dir: Optional[str] = None) -> np.ndarray:
+    """
+    Compute the counts of all combinations within a memory budget.
+
+    The counter array of all combinations is sized from `math.comb` and checked against the budget
+    before anything is read. The input is then packed to a temporary file, which is memory mapped and
+    streamed in row blocks. Besides the current block, only the counter array is held in memory.
+
+    Args:
+        chunks (Iterable[pd.DataFrame]): The input data chunks, each with a multiple of 64 rows but the last,
+            see `read_chunksize`.
+        samples (int): Number of sample columns of the input.
+        start_col (int): Column index to start reading sample data from.
+        num_samples (int): Number of samples per combination.
+        share_type (str): 'intersection', 'union' or 'quorum'.
+        max_memory (float): The memory budget in GB.
+        quorum (int, optional): The min number of samples for 'quorum'.
+        tmp_dir (str, optional): Directory of the temporary packed file.
+
+    Returns:
+        np.ndarray: int64 counts of all combinations in `itertools.combinations` order.
+    """
+    total = check_budget(samples, num_samples, max_memory)
+    budget = int(max_memory * 1024 ** 3)
+
+    fd, packed_file = tempfile.mkstemp(suffix='.packed', dir=tmp_dir)
+    os.close(fd)
+    try:
+        pack_to_file(chunks, start_col, packed_file)
+        counts = np.zeros(total, dtype=np.int64)
+
+        words = os.path.getsize(packed_file) // (8 * samples) if samples else 0
+        if words == 0:
+            return counts
+
+        # per word row: the block itself and the temporaries of the vectorised last level
+        planes = num_samples.bit_length() if share_type == 'quorum' else 1
+        row_bytes = 8 * samples * (2 + 2 * planes)
+        block_words = int(max(1, min(words, (budget - counts.nbytes) // row_bytes)))
+
+        util.logger.info(f'count {total} combinations over {words} packed words in blocks of {block_words} words (64 rows each)')
+
+        packed = np.memmap(packed_file, dtype=np.uint64, mode='r', shape=(words, samples))
+        for start in range(0, words, block_words):
+            block = np.ascontiguousarray(packed[start:start + block_words])
+            count_block(block, counts, num_samples, share_type, quorum)
+        del packed
+
+        return counts
+    finally:
+        os.remove(packed_file)
@@ -0,0 +1,123 @@
+from pathlib import Path
+from typing import Iterable, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from panstat import util
+
+
+def pair_shared(presence: np.ndarray, block_size: int = 1 << 16) -> np.ndarray:
+    """
+    Compute the shared counts of all sample pairs as the product X^T X of the presence matrix.
+
+    The rows are processed in blocks, each block product runs through BLAS in float32, which is
+    exact as long as the block has less than 2^24 rows, and is accumulated into an int64 matrix.
+
+    Args:
+        presence (np.ndarray): Boolean matrix of shape (genes, samples).
+        block_size (int): Number of rows per block.
+
+    Returns:
+        np.ndarray: int64 matrix of shape (samples, samples), the diagonal holds the count of each sample.
+    """
+    block_size = min(block_size, 1 << 24)
+    samples = presence.shape[1]
+    shared = np.zeros((samples, samples), dtype=np.int64)
+    for start in range(0, presence.shape[0], block_size):
+        block = presence[start:start + block_size].astype(np.float32)
+        shared += np.rint(block.T @ block).astype(np.int64)
+    return shared
+
+
+def overlap_matrices(presence: np.ndarray, block_size: int = 1 << 16) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Compute the shared, union and Jaccard matrices of all sample pairs.
+
+    Args:
+        presence (np.ndarray): Boolean matrix of shape (genes, samples).
+        block_size (int): Number of rows per block of the matrix product.
+
+    Returns:
+        Tuple containing the shared (int64), union (int64) and jaccard (float64) matrices.
+    """
+    shared = pair_shared(presence, block_size)
+    counts = np.diag(shared)
+    union = counts[:, None] + counts[None, :] - shared
+    with np.errstate(divide='ignore', invalid='ignore'):
+        jaccard = np.where(union > 0, shared / union, 0.0)
+    return shared, union, jaccard
+
+
+def pair_counts(presence: np.ndarray,
+                share_type: str = 'intersection',
+                block_size: int = 1 << 16) -> np.ndarray:
+    """
+    Shared or union counts of all sample pairs in `itertools.combinations` order.
+
+    The upper triangle of the overlap matrices read row by row is the combinations order.
+    """
+    shared, union, _ = overlap_matrices(presence, block_size)
+    rows, cols = np.triu_indices(presence.shape[1], k=1)
+    return (shared if share_type == 'intersection' else union)[rows, cols]
+
+
+def triple_overlap(presence: np.ndarray, block_size: int = 1 << 16) -> Iterable[Tuple[int, int, int, int, int]]:
+    """
+    Compute the shared and union counts of all sample triples.
+
+    For each sample i, the masked product (X * x_i)^T X gives the triple counts |i & j & l|,
+    the union follows by inclusion-exclusion.
+
+    Args:
+        presence (np.ndarray): Boolean matrix of shape (genes, samples).
+        block_size (int): Number of rows per block of the matrix product.
+
+    Yields:
+        Tuple[int, int, int, int, int]: (i, j, l, shared, union) for i < j < l.
+    """
+    samples = presence.shape[1]
+    shared = pair_shared(presence, block_size)
+    counts = np.diag(shared)
+
+    for i in range(samples - 2):
+        mask = presence[:, i:i + 1]
+        triple = pair_shared(presence[:, i + 1:] & mask, block_size)
+        rows, cols = np.triu_indices(samples - i - 1, k=1)
+        js, ls, triple_counts = rows + i + 1, cols + i + 1, triple[rows, cols]
+        unions = counts[i] + counts[js] + counts[ls] - shared[i, js] - shared[i, ls] - shared[js, ls] + triple_counts
+        for j, l, count, union in zip(js.tolist(), ls.tolist(), triple_counts.tolist(), unions.tolist()):
+            yield i, j, l, count, union
+
+
+def save_overlap(presence: np.ndarray,
+                 samples: Iterable[str],
+                 output_dir: Union[str, Path],
+                 triple: bool = False,
+                 block_size: int = 1 << 16):
+    """
+    Save the shared, union and jaccard matrices (and optionally the triple overlaps) to the output directory.
+
+    Args:
+        presence (np.ndarray): Boolean matrix of shape (genes, samples).
+        samples (Iterable[str]): The sample names.
+        output_dir (str): The output directory.
+        triple (bool): Also save the triple overlaps to `triple.tsv`.
+        block_size (int): Number of rows per block of the matrix product.
+    """
+    samples = list(samples)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    for name, matrix in zip(('shared', 'union', 'jaccard'), overlap_matrices(presence, block_size)):
+        outfile = output_dir / f'{name}.tsv'
+        pd.DataFrame(matrix, index=samples, columns=samples).to_csv(outfile, sep='\t')
+        util.logger.info(f'saved {name} matrix to: {outfile}')
+
+    if triple:
+        outfile = output_dir / 'triple.tsv'
+        with outfile.open('w') as out:
+            out.write('sample1\tsample2\tsample3\tshared\tunion\n')
+            for i, j, l, count, union in triple_overlap(presence, block_size):
+                out.write(f'{samples[i]}\t{samples[j]}\t{samples[l]}\t{count}\t{union}\n')
+        util.logger.info(f'saved triple overlaps to: {outfile}')
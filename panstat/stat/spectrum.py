@@ -0,0 +1,164 @@
+import math
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from panstat import util
+
+
+# Roary-style thresholds, the min fraction of genomes a gene must be present in for each class
+CLASS_THRESHOLDS = {
+    'core': 0.99,
+    'soft-core': 0.95,
+    'shell': 0.15,
+}
+
+
+def min_counts(num_genomes: int, thresholds: Optional[Dict[str, float]] = None) -> Dict[str, int]:
+    """
+    The min presence count of each class for `num_genomes` genomes.
+    """
+    thresholds = thresholds or CLASS_THRESHOLDS
+    # round off float noise, eg. 0.15 * 20 = 3.0000000000000004
+    return {name: math.ceil(round(fraction * num_genomes, 9)) for name, fraction in thresholds.items()}
+
+
+def classify(counts: np.ndarray, num_genomes: int, thresholds: Optional[Dict[str, float]] = None) -> np.ndarray:
+    """
+    Label each presence count as core, soft-core, shell or cloud (absent if the count is 0).
+
+    Args:
+        counts (np.ndarray): The presence counts of the genes.
+        num_genomes (int): Total number of genomes.
+        thresholds (dict, optional): The min fraction of each class, default `CLASS_THRESHOLDS`.
+
+    Returns:
+        np.ndarray: The class labels.
+    """
+    bounds = min_counts(num_genomes, thresholds)
+    return np.select([counts >= bounds['core'], counts >= bounds['soft-core'], counts >= bounds['shell'], counts > 0],
+                     ['core', 'soft-core', 'shell', 'cloud'], default='absent')
+
+
+def expected_curves(spectrum: np.ndarray) -> pd.DataFrame:
+    """
+    The expected core and pan sizes over all combinations of k genomes, computed from the frequency spectrum.
+
+    A gene present in f of n genomes is in the core of C(f, k) / C(n, k) of the combinations, and in the
+    pan of 1 - C(n - f, k) / C(n, k) of them, so the mean of `panstat stat` over all combinations is
+    sum_f S(f) * C(f, k) / C(n, k) (core) and sum_f S(f) * (1 - C(n - f, k) / C(n, k)) (pan).
+    The ratios are built up as products over k, which stays in float range for any n.
+
+    Args:
+        spectrum (np.ndarray): Number of genes present in exactly f genomes, for f = 0 .. n.
+
+    Returns:
+        pd.DataFrame: Rows of (share_count, share_type, value) for k = 2 .. n, the sizes of the stat results.
+    """
+    n = spectrum.size - 1
+    f = np.arange(n + 1, dtype=np.float64)
+    core_ratio = np.ones(n + 1)
+    absent_ratio = np.ones(n + 1)
+
+    rows = []
+    for k in range(1, n + 1):
+        # C(f, k) / C(n, k) = C(f, k - 1) / C(n, k - 1) * (f - k + 1) / (n - k + 1), 0 once f < k
+        core_ratio *= np.clip(f - k + 1, 0, None) / (n - k + 1)
+        absent_ratio *= np.clip(n - f - k + 1, 0, None) / (n - k + 1)
+        if k >= 2:
+            rows.append((k, 'core', float(spectrum @ core_ratio)))
+            rows.append((k, 'pan', float(spectrum @ (1 - absent_ratio))))
+
+    return pd.DataFrame(rows, columns=['share_count', 'share_type', 'value'])
+
+
+def save_spectrum(input_file: Union[str, Path],
+                  output_dir: Union[str, Path],
+                  header: Optional[int] = 0,
+                  sep: str = '\t',
+                  start_col: int = 1,
+                  chunksize: int = 1 << 16,
+                  thresholds: Optional[Dict[str, float]] = None) -> np.ndarray:
+    """
+    Compute the presence count and class of every gene, the frequency spectrum and the expected curves
+    in one streaming pass over the input.
+
+    The input is read in chunks of `chunksize` rows, the presence counts of a chunk are written to
+    `genes.tsv` and accumulated into the spectrum before the next chunk is read, so memory is bounded
+    by the chunk size. Output files in `output_dir`:
+        - genes.tsv: gene, count, fraction, class
+        - spectrum.tsv: count, fraction, genes, class
+        - classes.tsv: class, min_count, genes
+        - curves.tsv: the expected core/pan sizes in the format of `panstat plot`
+
+    Args:
+        input_file (str): Path to the input data file.
+        output_dir (str): The output directory.
+        header (int, optional): Row number to use as the column names.
+        sep (str): Delimiter to use for reading the input file.
+        start_col (int): Column index to start reading sample data from, the gene names are read from
+            the first column if `start_col` > 0, otherwise genes are numbered by row.
+        chunksize (int): Number of rows per chunk.
+        thresholds (dict, optional): The min fraction of each class, default `CLASS_THRESHOLDS`.
+
+    Returns:
+        np.ndarray: The frequency spectrum.
+    """
+    sep = '\t' if sep == '\\t' else sep
+    thresholds = thresholds or CLASS_THRESHOLDS
+    if not 1 >= thresholds['core'] >= thresholds['soft-core'] >= thresholds['shell'] > 0:
+        raise ValueError(f'class thresholds must satisfy 1 >= core >= soft-core >= shell > 0, got: {thresholds}')
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    header_row = pd.read_csv(input_file, sep=sep, header=header, nrows=0).columns
+    num_genomes = header_row.size - start_col
+    spectrum = np.zeros(num_genomes + 1, dtype=np.int64)
+
+    util.logger.info(f'stream data from file: {input_file} [{num_genomes} genomes]')
+
+    genes_file = output_dir / 'genes.tsv'
+    with genes_file.open('w') as out:
+        out.write('gene\tcount\tfraction\tclass\n')
+        chunks = pd.read_csv(input_file, sep=sep, header=header, usecols=range(header_row.size), chunksize=chunksize)
+        for df in chunks:
+            counts = (df.iloc[:, start_col:].to_numpy() > 0).sum(axis=1)
+            spectrum += np.bincount(counts, minlength=num_genomes + 1)
+            genes = df.iloc[:, 0] if start_col > 0 else df.index
+            pd.DataFrame({
+                'gene': genes,
+                'count': counts,
+                'fraction': counts / num_genomes,
+                'class': classify(counts, num_genomes, thresholds),
+            }).to_csv(out, sep='\t', header=False, index=False, float_format='%.4g')
+    util.logger.info(f'saved gene counts to: {genes_file}')
+
+    counts = np.arange(num_genomes + 1)
+    labels = classify(counts, num_genomes, thresholds)
+
+    spectrum_file = output_dir / 'spectrum.tsv'
+    pd.DataFrame({
+        'count': counts,
+        'fraction': counts / num_genomes,
+        'genes': spectrum,
+        'class': labels,
+    }).to_csv(spectrum_file, sep='\t', index=False, float_format='%.4g')
+    util.logger.info(f'saved frequency spectrum to: {spectrum_file}')
+
+    bounds = {**min_counts(num_genomes, thresholds), 'cloud': 1, 'absent': 0}
+    classes_file = output_dir / 'classes.tsv'
+    pd.DataFrame({
+        'class': list(bounds),
+        'min_count': list(bounds.values()),
+        'genes': [int(spectrum[labels == name].sum()) for name in bounds],
+    }).to_csv(classes_file, sep='\t', index=False)
+    util.logger.info(f'saved class summary to: {classes_file}')
+
+    curves_file = output_dir / 'curves.tsv'
+    expected_curves(spectrum).to_csv(curves_file, sep='\t', index=False, float_format='%.2f')
+    util.logger.info(f'saved expected core/pan curves to: {curves_file}')
+
+    return spectrum
@@ -1,7 +1,8 @@
+import re
 import math
 from pathlib import Path
 import textwrap
-from typing import Literal, Dict
+from typing import Literal, Dict, List, Union
 
 import pandas as pd
 import numpy as np
@@ -10,6 +11,30 @@ from simple_loggers import SimpleLogger
 
 logger = SimpleLogger('PanStat')
 
+# result directory prefix of each share type
+SHARE_PREFIXES = {
+    'intersection': 'x',
+    'union': 'y',
+    'quorum': 's',
+}
+
+# name of each result prefix in the processed statistics
+SHARE_NAMES = {
+    'x': 'core',
+    'y': 'pan',
+    's': 'softcore',
+}
+
+# name pattern of the result directories of all share types, eg. x13
+RESULT_DIR_PATTERN = re.compile(r'[xys]\d+')
+
+
+def result_dirs(path: Union[str, Path]) -> List[Path]:
+    """
+    List the result directories (eg. x2, y2, ..., s13) under the given path.
+    """
+    return sorted(p for p in Path(path).iterdir() if p.is_dir() and RESULT_DIR_PATTERN.fullmatch(p.name))
+
 
 def dynamic_chunkcount(sample_count: int, threshold: int = 50000) -> Dict[int, int]:
     """
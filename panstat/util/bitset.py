@@ -0,0 +1,108 @@
+from typing import Iterable, Optional, Tuple, Union
+
+import numpy as np
+
+
+if hasattr(np, 'bitwise_count'):
+    def popcount(words: np.ndarray) -> int:
+        """
+        Count the set bits of a packed bit vector.
+        """
+        return int(np.bitwise_count(words).sum())
+
+    def popcount_columns(words: np.ndarray) -> np.ndarray:
+        """
+        Count the set bits of each column of a (words, columns) matrix.
+        """
+        return np.bitwise_count(words).sum(axis=0, dtype=np.int64)
+else:
+    _POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+    def popcount(words: np.ndarray) -> int:
+        """
+        Count the set bits of a packed bit vector.
+        """
+        return int(_POPCOUNT_TABLE[np.ascontiguousarray(words).view(np.uint8)].sum(dtype=np.int64))
+
+    def popcount_columns(words: np.ndarray) -> np.ndarray:
+        """
+        Count the set bits of each column of a (words, columns) matrix.
+        """
+        counts = _POPCOUNT_TABLE[np.ascontiguousarray(words.T).view(np.uint8)]
+        return counts.sum(axis=1, dtype=np.int64)
+
+
+def pack_presence(presence: np.ndarray) -> np.ndarray:
+    """
+    Pack a boolean presence matrix into one bit vector per sample.
+
+    Args:
+        presence (np.ndarray): Boolean matrix of shape (genes, samples).
+
+    Returns:
+        np.ndarray: uint64 matrix of shape (samples, words), bit i of a sample is gene i.
+    """
+    presence = np.asarray(presence, dtype=bool)
+    genes, samples = presence.shape
+    words = -(-genes // 64)
+    padded = np.zeros((words * 64, samples), dtype=bool)
+    padded[:genes] = presence
+    packed = np.packbits(padded, axis=0, bitorder='little')
+    return np.ascontiguousarray(packed.T).view(np.uint64)
+
+
+class VerticalCounter(object):
+    """
+    Bit-sliced (vertical) counters, one counter per bit position of the packed vectors.
+
+    The counter of every gene is stored across `planes`, plane i holding bit i of all counters,
+    so adding a packed vector is a ripple-carry addition costing a few word operations per plane.
+
+    Attributes:
+        planes (np.ndarray): uint64 array of shape (bits, *shape), eg. (bits, words).
+    """
+
+    def __init__(self, max_count: int, shape: Union[int, Tuple[int, ...]]):
+        shape = (shape,) if isinstance(shape, int) else tuple(shape)
+        self.planes = np.zeros((max(max_count.bit_length(), 1), *shape), dtype=np.uint64)
+
+    def copy(self, shape: Optional[Tuple[int, ...]] = None) -> 'VerticalCounter':
+        """
+        Return a copy of the counters, broadcast to `shape` if given.
+        """
+        counter = VerticalCounter.__new__(VerticalCounter)
+        if shape is None:
+            counter.planes = self.planes.copy()
+        else:
+            planes = self.planes.reshape(self.planes.shape + (1,) * (len(shape) - self.planes.ndim + 1))
+            counter.planes = np.broadcast_to(planes, (len(self.planes), *shape)).copy()
+        return counter
+
+    def add(self, vector: np.ndarray):
+        carry = vector
+        for plane in self.planes:
+            plane_carry = plane & carry
+            plane ^= carry
+            carry = plane_carry
+
+    def add_all(self, vectors: Iterable[np.ndarray]):
+        for vector in vectors:
+            self.add(vector)
+
+    def at_least(self, threshold: int) -> np.ndarray:
+        """
+        Return the packed vector of positions whose counter is >= threshold.
+
+        The comparison runs from the most significant plane down, tracking the positions that are
+        already greater than the threshold and those still equal to its leading bits.
+        """
+        greater = np.zeros(self.planes.shape[1:], dtype=np.uint64)
+        equal = ~greater
+        for i in range(len(self.planes) - 1, -1, -1):
+            plane = self.planes[i]
+            if threshold >> i & 1:
+                equal &= plane
+            else:
+                greater |= equal & plane
+                equal &= ~plane
+        return greater | equal
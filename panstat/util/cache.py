@@ -0,0 +1,257 @@
+import os
+import json
+import fcntl
+import shutil
+import hashlib
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+from . import logger
+from .extremes import extremes_path
+
+
+# fraction of max_size the cache is evicted down to, so a full scan is only needed every few puts
+EVICT_RATIO = 0.9
+
+
+class ResultCache(object):
+    """
+    A content-addressed cache of stat results.
+
+    An entry is keyed by the hash of the input file content, the sample columns, the number of
+    samples, the share type (and min fraction), the row range and the compression of the result,
+    so changing the threshold or the output directory reuses all units whose key is unchanged.
+    Entries are evicted in least recently used order once the cache exceeds `max_size` bytes.
+    The total size is kept as a running estimate in the `size` file, so the entries are only
+    scanned when the estimate exceeds `max_size`, and then evicted down to `EVICT_RATIO` of it.
+
+    Attributes:
+        cache_dir (Path): The cache directory.
+        max_size (int): Max total size of the entries in bytes, no eviction if None.
+    """
+
+    def __init__(self, cache_dir: Union[str, Path], max_size: Optional[int] = None):
+        self.cache_dir = Path(cache_dir)
+        self.max_size = max_size
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_options(cls, cache_dir: Optional[str], cache_size: Optional[float] = None) -> Optional['ResultCache']:
+        """
+        Create the cache from the command line options, cache_size is in GB.
+        """
+        if not cache_dir:
+            return None
+        return cls(cache_dir, max_size=int(cache_size * 1024 ** 3) if cache_size else None)
+
+    def input_info(self, input_file: Union[str, Path]) -> Dict:
+        """
+        Return the content hash and the number of data rows of the input file.
+
+        Hashing large inputs is slow, so the result is memoized by (path, size, mtime).
+        """
+        path = Path(input_file).resolve()
+        stat = path.stat()
+        memo_file = self.cache_dir / 'inputs.json'
+        memo_key = f'{path}:{stat.st_size}:{stat.st_mtime_ns}'
+
+        try:
+            memo = json.loads(memo_file.read_text())
+        except (FileNotFoundError, ValueError):
+            memo = {}
+
+        if memo_key not in memo:
+            logger.debug(f'hashing input file: {path}')
+            sha = hashlib.sha256()
+            lines = 0
+            block = b''
+            with path.open('rb') as f:
+                for block in iter(lambda: f.read(1 << 24), b''):
+                    sha.update(block)
+                    lines += block.count(b'\n')
+            if block and not block.endswith(b'\n'):
+                lines += 1
+            memo[memo_key] = {'hash': sha.hexdigest(), 'rows': lines - 1}
+            tmp = memo_file.with_name(f'.inputs.{os.getpid()}.json')
+            tmp.write_text(json.dumps(memo, indent=2))
+            os.replace(tmp, memo_file)
+
+        return memo[memo_key]
+
+    @staticmethod
+    def key(input_hash: str,
+            samples: Iterable[str],
+            num_samples: int,
+            share_type: str,
+            rows: Tuple[int, int],
+            min_fraction: Optional[float] = None,
+            compress: Optional[str] = None) -> str:
+        """
+        Build the key of a work unit.
+        """
+        unit = {
+            'input': input_hash,
+            'samples': list(samples),
+            'num_samples': num_samples,
+            'share_type': share_type,
+            'min_fraction': min_fraction if share_type == 'quorum' else None,
+            'rows': list(rows),
+            'compress': compress,
+        }
+        return hashlib.sha256(json.dumps(unit, sort_keys=True).encode()).hexdigest()
+
+    @staticmethod
+    def extremes_key(key: str, top: int) -> str:
+        """
+        The key of the extremes file cached beside the result of `key`.
+        """
+        return f'{key}.extremes{top}'
+
+    def fetch_unit(self, key: str, output_path: Union[str, Path], top: Optional[int] = None) -> bool:
+        """
+        Fetch the result of a unit, and its extremes file if `top` is set.
+
+        Returns:
+            bool: True if the result (and the extremes file) was found, a result without extremes is a miss.
+        """
+        if top and not self.fetch(self.extremes_key(key, top), extremes_path(output_path)):
+            return False
+        return self.fetch(key, output_path)
+
+    def entry(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / key
+
+    def fetch(self, key: str, output_path: Union[str, Path]) -> bool:
+        """
+        Copy the cached result of the key to the output path.
+
+        Returns:
+            bool: True if the key was found.
+        """
+        entry = self.entry(key)
+        if not entry.exists():
+            return False
+
+        output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            shutil.copyfile(entry, output_path)
+            # mark as recently used
+            os.utime(entry)
+        except FileNotFoundError:
+            # evicted by another process since the check
+            return False
+
+        logger.info(f'reuse cached result {key[:12]} for: {output_path}')
+        return True
+
+    def put(self, key: str, path: Union[str, Path]):
+        """
+        Store a result file under the key, then evict the least recently used entries.
+        """
+        entry = self.entry(key)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        tmp = entry.with_name(f'.{key}.{os.getpid()}')
+        shutil.copyfile(path, tmp)
+        try:
+            # an existing entry is replaced, only the difference adds to the size estimate
+            old_size = entry.stat().st_size
+        except FileNotFoundError:
+            old_size = 0
+        os.replace(tmp, entry)
+        logger.debug(f'cached result {key[:12]}: {path}')
+
+        estimate = self.add_size(entry.stat().st_size - old_size)
+        if self.max_size is not None and (estimate is None or estimate > self.max_size):
+            self.evict()
+
+    def add_size(self, delta: int) -> Optional[int]:
+        """
+        Add to the running size estimate of the cache.
+
+        Returns:
+            int: The new estimate, None if there is no estimate yet (eg. a cache created by an older version).
+        """
+        with (self.cache_dir / 'size').open('a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            value = f.read().strip()
+            if not value:
+                return None
+            total = int(value) + delta
+            f.seek(0)
+            f.truncate()
+            f.write(str(total))
+        return total
+
+    def pending_units(self,
+                      units: Iterable[Dict],
+                      input_file: Union[str, Path],
+                      samples: Iterable[str],
+                      compress: Optional[str] = None,
+                      top: Optional[int] = None) -> Iterable[Dict]:
+        """
+        Copy the cached results of the planned units to their output files, and yield the units left to compute.
+
+        Args:
+            units (Iterable[Dict]): The units planned by `shell.iter_stat_units`.
+            input_file (str): Path to the input data file.
+            samples (Iterable[str]): The sample columns of the input data.
+            compress (str, optional): Compression of the result files.
+            top (int, optional): Number of extreme combinations per unit, the extremes file is fetched as well.
+
+        Yields:
+            dict: The units without cached result.
+        """
+        info = self.input_info(input_file)
+        samples = list(samples)
+        reused = 0
+        for unit in units:
+            key = self.key(info['hash'], samples, unit['num_samples'], unit['share_type'],
+                           rows=row_range(info['rows'], unit['chunksize'], unit['chunk']),
+                           min_fraction=unit.get('min_fraction'),
+                           compress=compress)
+            if self.fetch_unit(key, unit['output_file'], top):
+                reused += 1
+            else:
+                yield unit
+        logger.info(f'reused {reused} cached units')
+
+    def evict(self):
+        """
+        Scan the entries, evict the least recently used ones down to `EVICT_RATIO` of `max_size`
+        and reset the size estimate to the remaining total.
+        """
+        entries = []
+        for entry in self.cache_dir.glob('??/*'):
+            if entry.name.startswith('.'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+
+        total = sum(size for _, size, _ in entries)
+        if self.max_size is not None:
+            for _, size, entry in sorted(entries):
+                if total <= self.max_size * EVICT_RATIO:
+                    break
+                entry.unlink(missing_ok=True)
+                total -= size
+                logger.debug(f'evicted cached result: {entry.name[:12]}')
+
+        with (self.cache_dir / 'size').open('a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            f.truncate()
+            f.write(str(total))
+
+
+def row_range(total_rows: int, chunksize: Optional[int] = None, chunk: Optional[int] = None) -> Tuple[int, int]:
+    """
+    The [start, stop) data rows read for the chunksize and chunk of a unit.
+    """
+    if not (chunksize and chunk):
+        return 0, total_rows
+    return min((chunk - 1) * chunksize, total_rows), min(chunk * chunksize, total_rows)
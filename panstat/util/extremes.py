@@ -0,0 +1,144 @@
+import math
+import heapq
+from pathlib import Path
+from typing import Iterable, List, Tuple, Union
+
+import numpy as np
+
+from . import logger
+
+
+def extremes_path(output_path: Union[str, Path]) -> Path:
+    """
+    The extremes file beside a result file, eg. x13_1.txt.gz -> x13_1.extremes.tsv.
+    """
+    output_path = Path(output_path)
+    return output_path.with_name(output_path.name.split('.')[0] + '.extremes.tsv')
+
+
+def unrank_combination(rank: int, n: int, k: int) -> Tuple[int, ...]:
+    """
+    Return the combination at `rank` in the lexicographic order of `itertools.combinations(range(n), k)`.
+    """
+    combination = []
+    start = 0
+    for remaining in range(k, 0, -1):
+        for i in range(start, n):
+            count = math.comb(n - i - 1, remaining - 1)
+            if rank < count:
+                combination.append(i)
+                start = i + 1
+                break
+            rank -= count
+    return tuple(combination)
+
+
+class ExtremesTracker(object):
+    """
+    Keep the `top` smallest and largest counts with their combination ranks in bounded heaps.
+
+    Only counts beating the current heap root touch the heaps, so the traversal cost is a
+    comparison per combination. Ties are resolved to the lower rank.
+
+    Attributes:
+        top (int): Number of combinations kept on each side.
+    """
+
+    def __init__(self, top: int):
+        self.top = top
+        # max-heap of the smallest counts, as (-count, -rank)
+        self._lows = []
+        # min-heap of the largest counts, as (count, -rank)
+        self._highs = []
+
+    def track(self, results: Iterable[int]) -> Iterable[int]:
+        """
+        Pass the results through, tracking the extremes.
+        """
+        lows, highs, top = self._lows, self._highs, self.top
+        for rank, count in enumerate(results):
+            if len(highs) < top:
+                heapq.heappush(highs, (count, -rank))
+                heapq.heappush(lows, (-count, -rank))
+            else:
+                if count > highs[0][0]:
+                    heapq.heapreplace(highs, (count, -rank))
+                if count < -lows[0][0]:
+                    heapq.heapreplace(lows, (-count, -rank))
+            yield count
+
+    def track_array(self, results: np.ndarray) -> np.ndarray:
+        """
+        Track the extremes of an array of results at once.
+        """
+        lows, highs = select_extremes(results, self.top)
+        self._lows = [(-count, -rank) for rank, count in lows]
+        self._highs = [(count, -rank) for rank, count in highs]
+        return results
+
+    def extremes(self) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]:
+        """
+        Returns:
+            The (rank, count) lists of the smallest (ascending) and the largest (descending) counts.
+        """
+        lows = sorted((-neg_count, -neg_rank) for neg_count, neg_rank in self._lows)
+        highs = sorted((-count, -neg_rank) for count, neg_rank in self._highs)
+        return [(rank, count) for count, rank in lows], [(rank, -neg_count) for neg_count, rank in highs]
+
+
+def _smallest(values: np.ndarray, top: int) -> np.ndarray:
+    # indices of the `top` smallest values, ties resolved to the lower index
+    if top >= values.size:
+        index = np.arange(values.size)
+    else:
+        kth = np.partition(values, top - 1)[top - 1]
+        less = np.flatnonzero(values < kth)
+        equal = np.flatnonzero(values == kth)[:top - less.size]
+        index = np.concatenate([less, equal])
+    return index[np.lexsort((index, values[index]))]
+
+
+def select_extremes(counts: np.ndarray, top: int) -> Tuple[List[Tuple[int, int]], List[Tuple[int, int]]]:
+    """
+    Select the (rank, count) of the `top` smallest and largest counts of an array in O(n).
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    lows = _smallest(counts, top)
+    highs = _smallest(-counts, top)
+    return ([(int(i), int(counts[i])) for i in lows],
+            [(int(i), int(counts[i])) for i in highs])
+
+
+def save_extremes(path: Union[str, Path],
+                  lows: List[Tuple[int, int]],
+                  highs: List[Tuple[int, int]],
+                  samples: Iterable[str],
+                  num_samples: int):
+    """
+    Save the extreme combinations with their sample names.
+
+    The sample columns and k are written in the header, so that the ranks can be resolved again
+    when the results are merged.
+    """
+    samples = list(samples)
+    with Path(path).open('w') as out:
+        out.write(f'# samples: {",".join(samples)}\n')
+        out.write(f'# num_samples: {num_samples}\n')
+        out.write('type\trank\tcount\tsamples\n')
+        for kind, items in (('min', lows), ('max', highs)):
+            for rank, count in items:
+                names = ','.join(samples[i] for i in unrank_combination(rank, len(samples), num_samples))
+                out.write(f'{kind}\t{rank}\t{count}\t{names}\n')
+    logger.info(f'saved extreme combinations to: {path}')
+
+
+def load_extremes_header(path: Union[str, Path]) -> Tuple[List[str], int, int]:
+    """
+    Returns:
+        The samples, num_samples and top of an extremes file.
+    """
+    with Path(path).open() as f:
+        samples = f.readline().split(': ', 1)[1].strip().split(',')
+        num_samples = int(f.readline().split(': ', 1)[1])
+        top = sum(1 for line in f if line.startswith('min\t'))
+    return samples, num_samples, top
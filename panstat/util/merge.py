@@ -4,7 +4,9 @@ from multiprocessing import Pool
 
 import numpy as np
 
-from . import logger
+from . import logger, result_dirs
+from .writer import load_result, result_files
+from .extremes import load_extremes_header, save_extremes, select_extremes
 
 
 def merge_path_result(merge_dir: str, path: Path):
@@ -15,9 +17,9 @@ def merge_path_result(merge_dir: str, path: Path):
     out_path.parent.mkdir(parents=True, exist_ok=True)
 
     sum_data = None
-    for file in path.glob('*.txt'):
+    for file in result_files(path):
         logger.debug(f'read file: {file.name}')
-        data = np.loadtxt(file, dtype=np.int64)
+        data = load_result(file)
         if sum_data is None:
             sum_data = data
         else:
@@ -27,14 +29,28 @@ def merge_path_result(merge_dir: str, path: Path):
 
     logger.debug(f'saved merged results to {out_path}')
 
+    # the chunks are row ranges, so a combination's total is the sum over chunks and the per-chunk
+    # extremes do not combine; select them again from the merged counts instead
+    extremes_files = list(path.glob('*.extremes.tsv'))
+    if extremes_files:
+        samples, num_samples, top = load_extremes_header(extremes_files[0])
+        lows, highs = select_extremes(sum_data.reshape(-1), top)
+        save_extremes(out_path.with_name(f'{path.name}.extremes.tsv'), lows, highs, samples, num_samples)
+
 
 def merge_result(result_dir: str, merge_dir: str = 'merge'):
     result_dir = Path(result_dir)
 
     logger.debug(f'stat from result dir: {result_dir}')
 
-    result_paths = list(result_dir.glob('[xy]*'))
+    result_paths = result_dirs(result_dir)
     logger.debug(f'found {len(result_paths)} result paths: {result_paths}')
-    
+
+    if not result_paths:
+        # per-group layout: result/<group>/x2 ...
+        for group_dir in sorted(p for p in result_dir.iterdir() if p.is_dir() and result_dirs(p)):
+            merge_result(group_dir, Path(merge_dir) / group_dir.name)
+        return
+
     with Pool() as pool:
         pool.map(partial(merge_path_result, merge_dir), result_paths)
@@ -1,9 +1,109 @@
 import math
+import itertools
 from pathlib import Path
 import textwrap
-from typing import Literal, Dict
+from typing import Literal, Dict, Optional
 
-from . import logger
+import pandas as pd
+
+from . import logger, SHARE_PREFIXES
+from .cache import ResultCache
+from .writer import result_path
+
+
+def iter_stat_units(chunkcounts: Dict[int, int],
+                    total_lines: int,
+                    result_dir: Path,
+                    compress: Optional[str] = None,
+                    min_fraction: Optional[float] = None):
+    """
+    Plan the work units of a batch run.
+
+    Each unit is one `panstat stat` call for a (num_samples, share_type, chunk) triple,
+    'quorum' units are planned in addition to 'intersection' and 'union' when min_fraction is given.
+
+    Parameters:
+    - chunkcounts (Dict[int, int]): A dictionary mapping the number of samples to the number of chunks.
+    - total_lines (int): Total number of lines in the input file.
+    - result_dir (Path): Directory where the result files will be saved.
+    - compress (str, optional): Compression of the result files ('gzip', 'xz', 'zstd' or None).
+    - min_fraction (float, optional): The min fraction of the 'quorum' share type.
+
+    Yields:
+    - dict: The unit with keys name, prefix, num_samples, share_type, min_fraction, chunksize, chunk and output_file.
+    """
+    share_types = ['intersection', 'union'] + (['quorum'] if min_fraction else [])
+    for num_samples, chunkcount in chunkcounts.items():
+        chunksize = math.ceil(total_lines / chunkcount) if chunkcount > 1 else 0
+        logger.debug(f'>>> num_samples: {num_samples}: chunkcount: {chunkcount}, chunksize: {chunksize}')
+
+        for chunk in range(1, chunkcount + 1):
+            for share_type in share_types:
+                prefix = SHARE_PREFIXES[share_type]
+                output_file = result_path(result_dir / f'{prefix}{num_samples}' / f'{prefix}{num_samples}_{chunk}.txt', compress)
+                yield {
+                    'name': f'{prefix}{num_samples}_{chunk}',
+                    'prefix': prefix,
+                    'num_samples': num_samples,
+                    'share_type': share_type,
+                    'min_fraction': min_fraction if share_type == 'quorum' else None,
+                    'chunksize': chunksize,
+                    'chunk': chunk,
+                    'output_file': str(output_file),
+                }
+
+
+def plan_units(chunkcounts: Dict[int, int],
+               total_lines: int,
+               input_file: str,
+               result_dir: Path,
+               start_col: int,
+               sep: str,
+               compress: Optional[str] = None,
+               min_fraction: Optional[float] = None,
+               cache: Optional[ResultCache] = None,
+               top: Optional[int] = None):
+    """
+    Plan the work units with `iter_stat_units`, skipping the units reused from the cache (if any).
+    """
+    units = iter_stat_units(chunkcounts, total_lines, result_dir, compress, min_fraction)
+    if cache:
+        sep = '\t' if sep == '\\t' else sep
+        samples = pd.read_csv(input_file, sep=sep, nrows=0).columns[start_col:]
+        units = cache.pending_units(units, input_file, samples, compress, top)
+    return units
+
+
+def stat_options(input_file: str,
+                 start_col: int,
+                 sep: str,
+                 compress: Optional[str] = None,
+                 cache: Optional[ResultCache] = None,
+                 top: Optional[int] = None):
+    """
+    The `panstat stat` options shared by all units of a batch run.
+    """
+    if sep == '\t':
+        sep = r'\\t'
+
+    options = [
+        f'-i {Path(input_file).resolve()}',
+        f'--start-col {start_col}',
+        f'--sep {sep}',
+    ]
+    if compress:
+        options.append(f'--compress {compress}')
+    if top:
+        options.append(f'--top {top}')
+    if cache:
+        options.append(f'--cache-dir {cache.cache_dir.resolve()}')
+        if cache.max_size:
+            options.append(f'--cache-size {cache.max_size / 1024 ** 3:g}')
+    return options
+
+
+def format_command(command: str, options: list) -> str:
+    return f'{command} \\\n' + ' \\\n'.join(f'    {option}' for option in options) + '\n'
 
 
 def generate_stat_shell(chunkcounts: Dict[int, int],
@@ -12,7 +112,11 @@ def generate_stat_shell(chunkcounts: Dict[int, int],
                         shell_dir: Path,
                         result_dir: Path,
                         start_col: int,
-                        sep: str):
+                        sep: str,
+                        compress: Optional[str] = None,
+                        min_fraction: Optional[float] = None,
+                        cache: Optional[ResultCache] = None,
+                        top: Optional[int] = None):
     """
     Generate shell scripts for statistical analysis based on input parameters.
 
@@ -28,38 +132,153 @@ def generate_stat_shell(chunkcounts: Dict[int, int],
     - result_dir (Path): Directory where the result files will be saved.
     - start_col (int): Column number to start the statistical analysis.
     - sep (str): Separator used in the input file.
+    - compress (str, optional): Compression of the result files ('gzip', 'xz', 'zstd' or None).
+    - min_fraction (float, optional): The min fraction of the 'quorum' share type.
+    - cache (ResultCache, optional): The result cache, cached units are copied to the result directory
+      instead of generating their shells, and the shells store their results into the cache.
+    - top (int, optional): Number of extreme combinations to report per unit.
 
     Yields:
     - Path: Path to the generated shell script.
     """
+    logger.debug(f'{input_file} total_lines: {total_lines}')
 
-    if sep == '\t':
-        sep = r'\\t'
+    units = plan_units(chunkcounts, total_lines, input_file, result_dir, start_col, sep, compress, min_fraction, cache, top)
+    common_options = stat_options(input_file, start_col, sep, compress, cache, top)
 
-    logger.debug(f'{input_file} total_lines: {total_lines}')
+    for unit in units:
+        prefix, num_samples, chunk = unit['prefix'], unit['num_samples'], unit['chunk']
+        stat_shell = shell_dir / f'{prefix}{num_samples}' / f'stat.{prefix}{num_samples}_{chunk}.sh'
+        stat_shell.parent.mkdir(parents=True, exist_ok=True)
+        options = [
+            f'-o {unit["output_file"]}',
+            f'-n {num_samples}',
+            f'-t {unit["share_type"]}',
+            f'--chunksize {unit["chunksize"]}',
+            f'--chunk {chunk}',
+        ]
+        if unit['min_fraction']:
+            options.append(f'--min-fraction {unit["min_fraction"]}')
+        cmd = format_command('panstat stat', common_options + options)
+        stat_shell.write_text(cmd)
+        yield stat_shell
 
-    for num_samples, chunkcount in chunkcounts.items():
-        chunksize = math.ceil(total_lines / chunkcount) if chunkcount > 1 else 0
-        logger.debug(f'>>> num_samples: {num_samples}: chunkcount: {chunkcount}, chunksize: {chunksize}')
 
-        for chunk in range(1, chunkcount + 1):
-            for prefix, share_type in zip('xy', ('intersection', 'union')):
-                stat_shell = shell_dir / f'{prefix}{num_samples}' / f'stat.{prefix}{num_samples}_{chunk}.sh'
-                output_file = result_dir / f'{prefix}{num_samples}' / f'{prefix}{num_samples}_{chunk}.txt'
-                stat_shell.parent.mkdir(parents=True, exist_ok=True)
-                cmd = textwrap.dedent(f'''\
-                    panstat stat \\
-                        -i {Path(input_file).resolve()} \\
-                        -o {output_file} \\
-                        --start-col {start_col} \\
-                        --sep {sep} \\
-                        -n {num_samples} \\
-                        -t {share_type} \\
-                        --chunksize {chunksize} \\
-                        --chunk {chunk}
-                ''')
-                stat_shell.write_text(cmd)
-                yield stat_shell
+# array directive and task index variable of each scheduler
+ARRAY_SCHEDULERS = {
+    'slurm': ('#SBATCH --array=1-{tasks}', '${SLURM_ARRAY_TASK_ID}'),
+    'sge': ('#$ -t 1-{tasks}', '${SGE_TASK_ID}'),
+    'generic': ('# usage: bash {name} TASK_INDEX  (1-{tasks})', '${1:?TASK_INDEX is required}'),
+}
+
+PARAMS_COLUMNS = ['name', 'num_samples', 'share_type', 'min_fraction', 'chunksize', 'chunk', 'output_file']
+
+
+def generate_array_shells(chunkcounts: Dict[int, int],
+                          total_lines: int,
+                          input_file: str,
+                          shell_dir: Path,
+                          result_dir: Path,
+                          start_col: int,
+                          sep: str,
+                          scheduler: Literal['slurm', 'sge', 'generic'] = 'slurm',
+                          pack: int = 1,
+                          compress: Optional[str] = None,
+                          min_fraction: Optional[float] = None,
+                          cache: Optional[ResultCache] = None,
+                          top: Optional[int] = None):
+    """
+    Generate one parameter table and one array job script per number of samples.
+
+    Instead of one shell per unit, the units of each k level are written as rows of `params.k{k}.tsv`,
+    and `stat.k{k}.sh` runs `panstat task` on the rows of its task index, `pack` rows per task.
+
+    Parameters:
+    - chunkcounts (Dict[int, int]): A dictionary mapping the number of samples to the number of chunks.
+    - total_lines (int): Total number of lines in the input file.
+    - input_file (str): Path to the input data file.
+    - shell_dir (Path): Directory where the generated scripts and tables will be saved.
+    - result_dir (Path): Directory where the result files will be saved.
+    - start_col (int): Column number to start the statistical analysis.
+    - sep (str): Separator used in the input file.
+    - scheduler (str): The array syntax, 'slurm', 'sge' or 'generic' (task index as the first argument).
+    - pack (int): Number of units computed by each array task.
+    - compress (str, optional): Compression of the result files ('gzip', 'xz', 'zstd' or None).
+    - min_fraction (float, optional): The min fraction of the 'quorum' share type.
+    - cache (ResultCache, optional): The result cache.
+    - top (int, optional): Number of extreme combinations to report per unit.
+
+    Yields:
+    - Tuple[Path, int]: Path to the generated array script and its number of tasks.
+    """
+    units = plan_units(chunkcounts, total_lines, input_file, result_dir, start_col, sep, compress, min_fraction, cache, top)
+    common_options = stat_options(input_file, start_col, sep, compress, cache, top)
+    directive, task_index = ARRAY_SCHEDULERS[scheduler]
+
+    array_dir = shell_dir / 'array'
+    array_dir.mkdir(parents=True, exist_ok=True)
+
+    for num_samples, k_units in itertools.groupby(units, key=lambda unit: unit['num_samples']):
+        k_units = list(k_units)
+        tasks = math.ceil(len(k_units) / pack)
+
+        params_file = array_dir / f'params.k{num_samples}.tsv'
+        with params_file.open('w') as out:
+            out.write('\t'.join(PARAMS_COLUMNS) + '\n')
+            for unit in k_units:
+                out.write('\t'.join('' if unit[col] is None else str(unit[col]) for col in PARAMS_COLUMNS) + '\n')
+
+        array_shell = array_dir / f'stat.k{num_samples}.sh'
+        options = [f'--index {task_index}', f'--pack {pack}'] + common_options
+        cmd = '#!/bin/bash\n'
+        cmd += directive.format(tasks=tasks, name=array_shell.name) + '\n'
+        cmd += format_command(f'panstat task {params_file}', options)
+        array_shell.write_text(cmd)
+
+        logger.debug(f'>>> num_samples: {num_samples}: {len(k_units)} units in {tasks} array tasks')
+
+        yield array_shell, tasks
+
+
+def generate_submit_shell(array_shells: list,
+                          merge_shell: Path,
+                          plot_shell: Path,
+                          shell_dir: Path,
+                          scheduler: Literal['slurm', 'sge', 'generic'] = 'slurm'):
+    """
+    Generate a shell to submit the array jobs, then the merge and plot jobs depending on them.
+
+    Args:
+        array_shells: List of (array script, number of tasks).
+        merge_shell: The merge shell.
+        plot_shell: The plot shell.
+        shell_dir: The directory where the shell will be stored.
+        scheduler: The array syntax, 'slurm', 'sge' or 'generic' (run the tasks one by one locally).
+
+    Returns:
+        A Path object to the shell.
+    """
+    lines = ['#!/bin/bash', 'set -e']
+    if scheduler == 'slurm':
+        lines.append('ids=""')
+        for array_shell, _ in array_shells:
+            lines.append(f'ids="$ids:$(sbatch --parsable {array_shell})"')
+        lines.append(f'merge=$(sbatch --parsable ${{ids:+--dependency=afterok$ids}} --wrap "bash {merge_shell}")')
+        lines.append(f'sbatch --dependency=afterok:$merge --wrap "bash {plot_shell}"')
+    elif scheduler == 'sge':
+        for array_shell, _ in array_shells:
+            lines.append(f'qsub -cwd -N panstat_stat {array_shell}')
+        lines.append(f'qsub -cwd -N panstat_merge -hold_jid panstat_stat -b y bash {merge_shell}')
+        lines.append(f'qsub -cwd -N panstat_plot -hold_jid panstat_merge -b y bash {plot_shell}')
+    else:
+        for array_shell, tasks in array_shells:
+            lines.append(f'for i in $(seq 1 {tasks}); do bash {array_shell} $i; done')
+        lines.append(f'bash {merge_shell}')
+        lines.append(f'bash {plot_shell}')
+
+    submit_shell = shell_dir / 'submit.sh'
+    submit_shell.write_text('\n'.join(lines) + '\n')
+    return submit_shell
 
 
 def generate_merge_shell(result_dir: Path, shell_dir: Path, merge_dir: str = 'merge'):
@@ -75,6 +294,7 @@ def generate_merge_shell(result_dir: Path, shell_dir: Path, merge_dir: str = 'me
         A Path object to the shell.
     """
     merge_shell = shell_dir / 'merge.sh'
+    merge_shell.parent.mkdir(parents=True, exist_ok=True)
     cmd = f'panstat merge {result_dir} -o {merge_dir}\n'
     merge_shell.write_text(cmd)
     return merge_shell
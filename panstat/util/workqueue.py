@@ -0,0 +1,315 @@
+import os
+import json
+import time
+import shutil
+import socket
+import sqlite3
+import threading
+import contextlib
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Union
+
+from . import logger
+from .cache import ResultCache
+from .extremes import extremes_path
+
+
+class WorkQueue(ABC):
+    """
+    Base class of the work queues shared by the workers of a multi-node run.
+
+    A unit is a dict planned by `shell.iter_stat_units`, identified by its `name`.
+    A claimed unit carries a heartbeat, units whose heartbeat is older than the stale
+    timeout are considered to be held by dead workers and are put back to the queue.
+    """
+
+    @abstractmethod
+    def init(self, meta: Dict, units: Iterable[Dict]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def meta(self) -> Dict:
+        raise NotImplementedError
+
+    @abstractmethod
+    def claim(self, worker: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def heartbeat(self, name: str, worker: str) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def done(self, name: str, worker: str) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def requeue_stale(self, timeout: float) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def status(self) -> Dict[str, int]:
+        raise NotImplementedError
+
+
+class DirQueue(WorkQueue):
+    """
+    A work queue on a (shared) directory.
+
+    Each unit is a json file under `todo/`, `claimed/` or `done/`. Moving a file between
+    the states is done with `os.rename`, which is atomic on the same filesystem and acts as
+    the lock: only one worker can win the rename of a `todo/` file. The mtime of a claimed
+    file is its heartbeat.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.todo_dir = self.path / 'todo'
+        self.claimed_dir = self.path / 'claimed'
+        self.done_dir = self.path / 'done'
+
+    def init(self, meta: Dict, units: Iterable[Dict]):
+        for d in (self.todo_dir, self.claimed_dir, self.done_dir):
+            d.mkdir(parents=True, exist_ok=True)
+        self.path.joinpath('queue.json').write_text(json.dumps(meta, indent=2))
+        for unit in units:
+            tmp = self.path / f'.{unit["name"]}.json'
+            tmp.write_text(json.dumps(unit))
+            os.rename(tmp, self.todo_dir / f'{unit["name"]}.json')
+
+    def meta(self) -> Dict:
+        return json.loads(self.path.joinpath('queue.json').read_text())
+
+    def claim(self, worker: str) -> Optional[Dict]:
+        for file in sorted(self.todo_dir.glob('*.json')):
+            claimed = self.claimed_dir / file.name
+            try:
+                os.rename(file, claimed)
+                # rename keeps the mtime, refresh the heartbeat before anyone sees a stale unit
+                os.utime(claimed)
+            except FileNotFoundError:
+                # claimed by another worker
+                continue
+            unit = json.loads(claimed.read_text())
+            unit['worker'] = worker
+            claimed.write_text(json.dumps(unit))
+            return unit
+        return None
+
+    def _owned(self, name: str, worker: str) -> Optional[Path]:
+        claimed = self.claimed_dir / f'{name}.json'
+        try:
+            unit = json.loads(claimed.read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+        return claimed if unit.get('worker') == worker else None
+
+    def heartbeat(self, name: str, worker: str) -> bool:
+        claimed = self._owned(name, worker)
+        if claimed is None:
+            return False
+        try:
+            os.utime(claimed)
+        except FileNotFoundError:
+            # requeued by another worker since the ownership check
+            return False
+        return True
+
+    def done(self, name: str, worker: str) -> bool:
+        claimed = self._owned(name, worker)
+        if claimed is None:
+            return False
+        try:
+            os.rename(claimed, self.done_dir / claimed.name)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def requeue_stale(self, timeout: float) -> int:
+        count = 0
+        now = time.time()
+        for file in self.claimed_dir.glob('*.json'):
+            try:
+                if now - file.stat().st_mtime < timeout:
+                    continue
+                os.rename(file, self.todo_dir / file.name)
+            except FileNotFoundError:
+                continue
+            logger.warning(f'requeue stale unit: {file.stem}')
+            count += 1
+        return count
+
+    def status(self) -> Dict[str, int]:
+        return {
+            state: len(list(d.glob('*.json')))
+            for state, d in zip(('todo', 'claimed', 'done'), (self.todo_dir, self.claimed_dir, self.done_dir))
+        }
+
+
+class SQLiteQueue(WorkQueue):
+    """
+    A work queue in a local SQLite file, state changes are serialized by `BEGIN IMMEDIATE`.
+
+    SQLite locking is unreliable on network filesystems, use `DirQueue` for multi-node runs.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+
+    def _connect(self):
+        return contextlib.closing(sqlite3.connect(self.path, timeout=60, isolation_level=None))
+
+    def init(self, meta: Dict, units: Iterable[Dict]):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS meta (value TEXT)')
+            conn.execute('CREATE TABLE IF NOT EXISTS units '
+                         '(name TEXT PRIMARY KEY, unit TEXT, state TEXT, worker TEXT, heartbeat REAL)')
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('DELETE FROM meta')
+            conn.execute('INSERT INTO meta VALUES (?)', (json.dumps(meta),))
+            conn.executemany("INSERT OR REPLACE INTO units VALUES (?, ?, 'todo', NULL, NULL)",
+                             ((unit['name'], json.dumps(unit)) for unit in units))
+            conn.execute('COMMIT')
+
+    def meta(self) -> Dict:
+        with self._connect() as conn:
+            return json.loads(conn.execute('SELECT value FROM meta').fetchone()[0])
+
+    def claim(self, worker: str) -> Optional[Dict]:
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute("SELECT name, unit FROM units WHERE state = 'todo' ORDER BY name LIMIT 1").fetchone()
+            if row:
+                conn.execute("UPDATE units SET state = 'claimed', worker = ?, heartbeat = ? WHERE name = ?",
+                             (worker, time.time(), row[0]))
+            conn.execute('COMMIT')
+        if row is None:
+            return None
+        return {**json.loads(row[1]), 'worker': worker}
+
+    def _update(self, sql: str, params: tuple) -> int:
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            count = conn.execute(sql, params).rowcount
+            conn.execute('COMMIT')
+        return count
+
+    def heartbeat(self, name: str, worker: str) -> bool:
+        return self._update("UPDATE units SET heartbeat = ? WHERE name = ? AND worker = ? AND state = 'claimed'",
+                            (time.time(), name, worker)) > 0
+
+    def done(self, name: str, worker: str) -> bool:
+        return self._update("UPDATE units SET state = 'done' WHERE name = ? AND worker = ? AND state = 'claimed'",
+                            (name, worker)) > 0
+
+    def requeue_stale(self, timeout: float) -> int:
+        count = self._update("UPDATE units SET state = 'todo', worker = NULL WHERE state = 'claimed' AND heartbeat < ?",
+                             (time.time() - timeout,))
+        if count:
+            logger.warning(f'requeue {count} stale units')
+        return count
+
+    def status(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            counts = dict(conn.execute('SELECT state, COUNT(*) FROM units GROUP BY state').fetchall())
+        return {state: counts.get(state, 0) for state in ('todo', 'claimed', 'done')}
+
+
+def open_queue(path: Union[str, Path]) -> WorkQueue:
+    """
+    Open a work queue, paths ending with `.db` or `.sqlite` are SQLite queues, others are directory queues.
+    """
+    if Path(path).suffix in ('.db', '.sqlite'):
+        return SQLiteQueue(path)
+    return DirQueue(path)
+
+
+def worker_name() -> str:
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def run_worker(work_queue: WorkQueue,
+               worker: Optional[str] = None,
+               heartbeat_interval: float = 30,
+               stale_timeout: float = 300,
+               max_units: Optional[int] = None) -> int:
+    """
+    Claim and compute units from the queue until it is drained.
+
+    The heartbeat of the current unit is renewed from a background thread. Results are written
+    to a temporary file first and moved in place when the unit is done, so a unit that was
+    requeued while its worker was still alive never leaves a partial result.
+
+    Args:
+        work_queue: The work queue.
+        worker: Name of the worker, default is `hostname:pid`.
+        heartbeat_interval: Seconds between two heartbeats.
+        stale_timeout: Seconds without heartbeat after which a claimed unit is requeued.
+        max_units: Stop after computing this number of units.
+
+    Returns:
+        int: Number of units computed by this worker.
+    """
+    from panstat.stat import PanStat
+
+    worker = worker or worker_name()
+    meta = work_queue.meta()
+    cache = ResultCache.from_options(meta.get('cache_dir'), meta.get('cache_size'))
+    tmp_dir = Path(meta['result_dir']) / '.tmp' / worker.replace(':', '_')
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+
+    count = 0
+    while max_units is None or count < max_units:
+        work_queue.requeue_stale(stale_timeout)
+        unit = work_queue.claim(worker)
+        if unit is None:
+            break
+
+        logger.info(f'{worker} claimed unit: {unit["name"]}')
+
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(heartbeat_interval):
+                if not work_queue.heartbeat(unit['name'], worker):
+                    logger.warning(f'{worker} lost unit: {unit["name"]}')
+                    break
+
+        beater = threading.Thread(target=beat, daemon=True)
+        beater.start()
+        try:
+            ps = PanStat(input_file=meta['input_file'],
+                         num_samples=unit['num_samples'],
+                         share_type=unit['share_type'],
+                         sep=meta['sep'],
+                         start_col=meta['start_col'],
+                         show_progress=False,
+                         chunksize=unit['chunksize'],
+                         chunk=unit['chunk'],
+                         min_fraction=unit.get('min_fraction'),
+                         compress=meta.get('compress'),
+                         top=meta.get('top'))
+            output_file = Path(unit['output_file'])
+            tmp_file = ps.run(tmp_dir / output_file.name, cache=cache)
+            tmp_extremes = extremes_path(tmp_file)
+        finally:
+            stop.set()
+            beater.join()
+
+        if work_queue.heartbeat(unit['name'], worker):
+            # a requeued copy of this unit writes the same result, so moving before `done` is safe
+            output_file.parent.mkdir(parents=True, exist_ok=True)
+            shutil.move(tmp_file, output_file)
+            if tmp_extremes.exists():
+                shutil.move(tmp_extremes, extremes_path(output_file))
+            work_queue.done(unit['name'], worker)
+            count += 1
+        else:
+            logger.warning(f'{worker} discard result of unit {unit["name"]}, it was requeued')
+            tmp_file.unlink()
+            tmp_extremes.unlink(missing_ok=True)
+
+    logger.info(f'{worker} finished {count} units')
+    return count
@@ -0,0 +1,202 @@
+import gzip
+import lzma
+import queue
+import threading
+import itertools
+from pathlib import Path
+from typing import IO, Iterable, List, Literal, Optional, Union
+
+import numpy as np
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+COMPRESS_SUFFIXES = {
+    'gzip': '.gz',
+    'xz': '.xz',
+    'zstd': '.zst',
+}
+
+# suffixes of plain and compressed result files
+RESULT_SUFFIXES = ['.txt'] + [f'.txt{suffix}' for suffix in COMPRESS_SUFFIXES.values()]
+
+
+def result_files(path: Union[str, Path]) -> List[Path]:
+    """
+    Return the plain and compressed result files of a result directory, one per unit.
+
+    Raises:
+        ValueError: If a unit exists more than once, eg. both x3_1.txt and x3_1.txt.gz after re-running
+            with --compress into the same output directory, as summing both would double its counts.
+    """
+    units = {}
+    for file in sorted(Path(path).iterdir()):
+        for suffix in RESULT_SUFFIXES:
+            if file.name.endswith(suffix):
+                units.setdefault(file.name[:-len(suffix)], []).append(file)
+                break
+
+    duplicates = {stem: files for stem, files in units.items() if len(files) > 1}
+    if duplicates:
+        stem, files = next(iter(duplicates.items()))
+        raise ValueError(f'found {len(duplicates)} units with more than one result file in {path}, '
+                         f'eg. {stem}: {", ".join(file.name for file in files)}, please remove the stale ones')
+
+    return [files[0] for files in units.values()]
+
+
+def result_path(output_file: Union[str, Path], compress: Optional[str] = None) -> Path:
+    """
+    Return the output path with the suffix of the given compression appended (if not present already).
+    """
+    output_path = Path(output_file)
+    suffix = COMPRESS_SUFFIXES.get(compress)
+    if suffix and output_path.suffix != suffix:
+        output_path = output_path.with_name(output_path.name + suffix)
+    return output_path
+
+
+def open_result(path: Union[str, Path], mode: Literal['rb', 'wb'] = 'rb', compress: Optional[str] = None) -> IO[bytes]:
+    """
+    Open a result file in binary mode, the compression is inferred from the suffix when reading.
+
+    Args:
+        path: Path to the result file.
+        mode: 'rb' or 'wb'.
+        compress: The compression to use when writing ('gzip', 'xz', 'zstd' or None).
+
+    Returns:
+        A binary file object.
+    """
+    path = Path(path)
+    if mode == 'rb':
+        compress = {suffix: name for name, suffix in COMPRESS_SUFFIXES.items()}.get(path.suffix)
+
+    if compress == 'gzip':
+        return gzip.open(path, mode, compresslevel=6)
+    if compress == 'xz':
+        return lzma.open(path, mode)
+    if compress == 'zstd':
+        if zstandard is None:
+            raise ImportError('zstd compression requires the `zstandard` package, please install it first')
+        return zstandard.open(path, mode)
+    return path.open(mode)
+
+
+def load_result(path: Union[str, Path]) -> np.ndarray:
+    """
+    Load a (compressed) result file as an int64 array.
+    """
+    with open_result(path) as f:
+        return np.loadtxt(f, dtype=np.int64, ndmin=1)
+
+
+def format_block(block: np.ndarray) -> bytes:
+    """
+    Format an integer array as newline separated decimal text.
+
+    The text is built in numpy: the digits are written right aligned into a fixed-width uint8
+    buffer of one row per value (sign, digits, newline), and the leading padding is masked out,
+    so the work releases the GIL instead of formatting each value in Python.
+    """
+    if block.size == 0:
+        return b''
+
+    block = np.asarray(block, dtype=np.int64).ravel()
+    negative = block < 0
+    values = np.abs(block).astype(np.uint64)
+    width = len(str(int(values.max())))
+
+    # column 0 is the sign, columns 1..width the digits, the last column the newline
+    buf = np.empty((block.size, width + 2), dtype=np.uint8)
+    buf[:, 0] = ord('-')
+    buf[:, -1] = ord('\n')
+    keep = np.ones(buf.shape, dtype=bool)
+    keep[:, 0] = negative
+
+    rest = values.copy()
+    for column in range(width, 0, -1):
+        buf[:, column] = rest % 10 + ord('0')
+        rest //= 10
+        if column < width:
+            # leading zeros are padding, but keep the single digit of 0
+            keep[:, column] = values >= 10 ** (width - column)
+
+    return buf[keep].tobytes()
+
+
+class ResultWriter(object):
+    """
+    A double-buffered result writer.
+
+    Results are collected into blocks of `block_size` integers, each full block is handed over
+    to a background thread which formats and (optionally) compresses it, so that computing the next
+    block overlaps with writing the previous one.
+
+    Attributes:
+        output_path (Path): Path of the result file.
+        compress (str): The compression to use ('gzip', 'xz', 'zstd' or None).
+        block_size (int): Number of results per block.
+    """
+
+    def __init__(self, output_path: Union[str, Path], compress: Optional[str] = None, block_size: int = 1 << 20):
+        self.output_path = Path(output_path)
+        self.compress = compress
+        self.block_size = block_size
+
+        # one block being written while up to two more wait in the queue
+        self._queue = queue.Queue(maxsize=2)
+        self._thread = None
+        self._error = None
+
+    def _write_loop(self, f: IO[bytes]):
+        while True:
+            block = self._queue.get()
+            if block is None:
+                break
+            if self._error is None:
+                try:
+                    f.write(format_block(block))
+                except Exception as e:
+                    self._error = e
+
+    def __enter__(self):
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open_result(self.output_path, 'wb', compress=self.compress)
+        self._thread = threading.Thread(target=self._write_loop, args=(self._file,), daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+        if self._error is not None and exc[0] is None:
+            raise self._error
+
+    def put(self, block: np.ndarray):
+        """
+        Queue a block of results for writing, blocks while both buffers are busy.
+        """
+        if self._error is not None:
+            raise self._error
+        self._queue.put(np.asarray(block, dtype=np.int64))
+
+    def write(self, results: Iterable[int]):
+        """
+        Consume the results iterable block by block.
+        """
+        if isinstance(results, np.ndarray):
+            for start in range(0, results.size, self.block_size):
+                self.put(results[start:start + self.block_size])
+            return
+
+        results = iter(results)
+        while True:
+            block = np.fromiter(itertools.islice(results, self.block_size), dtype=np.int64)
+            if block.size == 0:
+                break
+            self.put(block)
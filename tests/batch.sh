@@ -1,3 +1,5 @@
 python3 -m panstat.bin.main batch -i demo.stat -t 500000
 python3 -m panstat.bin.main batch -i demo.stat -t 500000 --job run.job
 python3 -m panstat.bin.main batch -i demo.stat -t 500000 --job run.job --no-check
+python3 -m panstat.bin.main batch -i demo.stat -t 500000 --array slurm --pack 10
+python3 -m panstat.bin.main batch -i demo.stat -t 500000 --array generic --pack 10
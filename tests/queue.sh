@@ -0,0 +1,7 @@
+python3 -m panstat.bin.main queue init -i demo.stat -t 500000 -O queue_out queue_dir
+for i in 1 2 3 4; do
+    python3 -m panstat.bin.main queue work queue_dir --heartbeat 5 --stale-timeout 60 &
+done
+wait
+python3 -m panstat.bin.main queue status queue_dir
+python3 -m panstat.bin.main merge queue_out/result -o queue_out/merge
@@ -0,0 +1,8 @@
+# --update on appended genome columns must equal a full recompute
+cut -f1-8 demo.stat > demo.old.stat
+for share_type in intersection union quorum; do
+    python3 -m panstat.bin.main stat -i demo.old.stat -o update_out/old.$share_type.txt -n 3 -t $share_type --min-fraction 0.6
+    python3 -m panstat.bin.main stat -i demo.stat -o update_out/update.$share_type.txt -n 3 -t $share_type --min-fraction 0.6 --update update_out/old.$share_type.txt
+    python3 -m panstat.bin.main stat -i demo.stat -o update_out/full.$share_type.txt -n 3 -t $share_type --min-fraction 0.6
+    cmp update_out/update.$share_type.txt update_out/full.$share_type.txt
+done